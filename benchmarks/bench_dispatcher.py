@@ -0,0 +1,100 @@
+"""Microbenchmark for MessageDispatcher.add_data.
+
+Feeds one large coalesced TCP read containing N status pushes, similar to the
+burst a power-metering plug sends after reconnecting, and reports the cost per
+frame. The per-frame cost should stay flat as N grows.
+
+Run from the repository root with: python -m benchmarks.bench_dispatcher
+"""
+import struct
+import time
+
+from .loader import load_localtuya
+
+load_localtuya()
+
+from localtuya import pytuya  # noqa: E402
+
+DEVICE_ID = "bf0123456789abcdefgh"
+BURST_SIZES = (1, 10, 100, 1000, 5000)
+
+
+class LegacyMessageDispatcher(pytuya.MessageDispatcher):
+    """Dispatcher using the previous slicing parser, for comparison."""
+
+    def __init__(self, dev_id, listener):
+        """Initialize a new LegacyMessageDispatcher."""
+        super().__init__(dev_id, listener)
+        self.buffer = b""
+
+    def add_data(self, data):
+        """Add new data to the buffer and try to parse messages."""
+        self.buffer += data
+        header_len = struct.calcsize(pytuya.MESSAGE_RECV_HEADER_FMT)
+
+        while self.buffer:
+            if len(self.buffer) < header_len:
+                break
+
+            _, seqno, cmd, length, retcode = struct.unpack_from(
+                pytuya.MESSAGE_RECV_HEADER_FMT, self.buffer
+            )
+            if len(self.buffer[header_len - 4 :]) < length:
+                break
+
+            if (retcode & 0xFFFFFF00) != 0:
+                payload_start = header_len - 4
+                payload_length = length - struct.calcsize(pytuya.MESSAGE_END_FMT)
+            else:
+                payload_start = header_len
+                payload_length = length - 4 - struct.calcsize(pytuya.MESSAGE_END_FMT)
+            payload = self.buffer[payload_start : payload_start + payload_length]
+
+            crc, _ = struct.unpack_from(
+                pytuya.MESSAGE_END_FMT,
+                self.buffer[payload_start + payload_length : payload_start + length],
+            )
+
+            self.buffer = self.buffer[header_len - 4 + length :]
+            self._dispatch(pytuya.TuyaMessage(seqno, cmd, retcode, payload, crc))
+
+
+def status_frame(seqno):
+    """Return a raw 0x08 status push as received from a device."""
+    payload = b'{"devId":"%s","dps":{"18":%d,"19":%d,"20":2301},"t":1605000000}' % (
+        DEVICE_ID.encode(),
+        seqno % 1000,
+        seqno % 500,
+    )
+    msg = pytuya.TuyaMessage(seqno, 0x08, 0, struct.pack(">I", 0) + payload, 0)
+    return pytuya.pack_message(msg)
+
+
+def measure(dispatcher_class, burst, repeat):
+    """Return best time per frame in microseconds for a burst of frames."""
+    data = b"".join(status_frame(i) for i in range(burst))
+    best = None
+    for _ in range(repeat):
+        received = []
+        dispatcher = dispatcher_class(DEVICE_ID, received.append)
+        dispatcher.debug = lambda *args: None
+        start = time.perf_counter()
+        dispatcher.add_data(data)
+        elapsed = time.perf_counter() - start
+        assert len(received) == burst
+        best = elapsed if best is None else min(best, elapsed)
+    return best / burst * 1e6
+
+
+def main():
+    """Run benchmark and print results."""
+    print(f"{'frames':>8} {'legacy us/frame':>16} {'current us/frame':>17}")
+    for burst in BURST_SIZES:
+        repeat = max(3, 2000 // burst)
+        legacy = measure(LegacyMessageDispatcher, burst, repeat)
+        current = measure(pytuya.MessageDispatcher, burst, repeat)
+        print(f"{burst:>8} {legacy:>16.2f} {current:>17.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Fixtures for the pytuya codec benchmarks.
+
+Benchmarks are driven by the device traces in the traces directory, see
+make_traces.py for how they are produced.
+"""
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+from .loader import load_localtuya
+
+load_localtuya()
+
+from localtuya import pytuya  # noqa: E402
+
+TRACES_DIR = Path(__file__).resolve().parent / "traces"
+
+DEVICE_TRACES = ["plug_31_type_0a", "plug_33_type_0a", "switch_33_type_0d"]
+
+
+def load_trace(name):
+    """Load a trace from disk."""
+    return json.loads((TRACES_DIR / f"{name}.json").read_text())
+
+
+@pytest.fixture(params=DEVICE_TRACES)
+def trace(request):
+    """Device trace to run benchmark with."""
+    return load_trace(request.param)
+
+
+@pytest.fixture
+def received(trace):
+    """Raw frames received from device in trace."""
+    return [bytes.fromhex(frame) for frame in trace["received"]]
+
+
+@pytest.fixture
+def messages(trace, received):
+    """Messages received from device in trace, as parsed by the dispatcher."""
+    messages = []
+    dispatcher = pytuya.MessageDispatcher(trace["device_id"], None)
+    dispatcher._dispatch = messages.append
+    dispatcher.add_data(b"".join(received))
+    return messages
+
+
+@pytest.fixture
+def protocol(trace):
+    """Protocol instance set up like the device in trace."""
+    loop = asyncio.new_event_loop()
+
+    async def _create():
+        return pytuya.TuyaProtocol(
+            trace["device_id"],
+            trace["local_key"],
+            trace["protocol_version"],
+            loop.create_future(),
+            pytuya.EmptyListener(),
+        )
+
+    protocol = loop.run_until_complete(_create())
+    protocol.dev_type = trace["dev_type"]
+    protocol.add_dps_to_request(trace.get("dps_to_request", []))
+    yield protocol
+    loop.close()
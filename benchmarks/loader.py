@@ -0,0 +1,20 @@
+"""Import helpers for running benchmarks without Home Assistant installed.
+
+The integration package imports Home Assistant in its __init__.py, but pytuya and
+the discovery module only depend on cryptography. Registering a bare package
+object for the component directory allows importing those modules directly.
+"""
+import sys
+import types
+from pathlib import Path
+
+COMPONENT_DIR = Path(__file__).resolve().parent.parent / "custom_components/localtuya"
+
+
+def load_localtuya():
+    """Make the component directory importable as the "localtuya" package."""
+    if "localtuya" not in sys.modules:
+        package = types.ModuleType("localtuya")
+        package.__path__ = [str(COMPONENT_DIR)]
+        sys.modules["localtuya"] = package
+    return sys.modules["localtuya"]
@@ -0,0 +1,246 @@
+"""Load test pytuya against a fleet of simulated devices.
+
+The simulator runs in a separate process so that only the client side is
+measured. All devices are connected with pytuya.connect and their initial
+status is retrieved, after which every device is sent set commands at a fixed
+interval while the devices push datapoint changes. Reported are:
+
+- connect time, until the initial status was received
+- round trip time of set commands
+- CPU time of this process per frame received
+- memory allocated per connected device
+
+Memory is measured in a separate pass connecting all devices first, as tracing
+allocations would slow down the timed connects.
+
+Run from the repository root with: python -m benchmarks.loadtest --devices 200
+
+TuyaDevice needs a running Home Assistant, so the protocol is driven directly.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from .loader import load_localtuya
+
+load_localtuya()
+
+from localtuya import pytuya  # noqa: E402
+
+from .simulator import READY  # noqa: E402
+
+
+class CountingListener(pytuya.TuyaListener):
+    """Listener counting status updates pushed by a device."""
+
+    def __init__(self):
+        """Initialize a new CountingListener."""
+        self.updates = 0
+        self.disconnects = 0
+
+    def status_updated(self, status):
+        """Device updated status."""
+        self.updates += 1
+
+    def disconnected(self, exc):
+        """Device disconnected."""
+        self.disconnects += 1
+
+
+def percentile(values, percent):
+    """Return percentile of a list of values (nearest rank)."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+async def start_simulator(args):
+    """Start simulator process and return it along with its devices."""
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-m",
+        "benchmarks.simulator",
+        "--devices",
+        str(args.devices),
+        "--change-interval",
+        str(args.change_interval),
+        stdout=asyncio.subprocess.PIPE,
+    )
+    devices = []
+    while True:
+        line = (await process.stdout.readline()).decode().strip()
+        if line == READY:
+            return process, devices
+        if not line:
+            raise RuntimeError("Simulator exited before it was ready")
+        devices.append(json.loads(line))
+
+
+async def connect_device(device, semaphore, connect_times):
+    """Connect to a device and retrieve its initial status."""
+    listener = CountingListener()
+    async with semaphore:
+        started = time.perf_counter()
+        protocol = await pytuya.connect(
+            "127.0.0.1",
+            device["device_id"],
+            device["local_key"],
+            device["protocol_version"],
+            listener,
+            port=device["port"],
+        )
+        if device["dev_type"] == "type_0d":
+            protocol.add_dps_to_request(range(1, 26))
+        await protocol.status()
+        connect_times.append(time.perf_counter() - started)
+    return protocol, listener
+
+
+async def connect_all(devices, concurrency):
+    """Connect to all devices and return connections and connect times."""
+    connect_times = []
+    semaphore = asyncio.Semaphore(concurrency)
+    connections = await asyncio.gather(
+        *[connect_device(device, semaphore, connect_times) for device in devices]
+    )
+    return connections, connect_times
+
+
+async def measure_memory(devices, concurrency):
+    """Return memory allocated while connecting to all devices."""
+    tracemalloc.start()
+    try:
+        allocated = tracemalloc.get_traced_memory()[0]
+        connections, _ = await connect_all(devices, concurrency)
+        allocated = tracemalloc.get_traced_memory()[0] - allocated
+    finally:
+        tracemalloc.stop()
+    for protocol, _ in connections:
+        protocol.close()
+    # Let transports close before devices are connected again
+    await asyncio.sleep(0.1)
+    return allocated
+
+
+async def send_commands(protocol, interval, deadline, round_trips):
+    """Toggle a datapoint every interval seconds until deadline."""
+    loop = asyncio.get_running_loop()
+    await asyncio.sleep(random.uniform(0, interval))
+    value = False
+    while loop.time() < deadline:
+        started = time.perf_counter()
+        await protocol.set_dp(value, 1)
+        round_trips.append(time.perf_counter() - started)
+        value = not value
+        await asyncio.sleep(interval)
+
+
+async def run(args):
+    """Run load test and return results."""
+    process, devices = await start_simulator(args)
+    protocols = []
+    try:
+        allocated = await measure_memory(devices, args.connect_concurrency)
+
+        started = time.perf_counter()
+        connections, connect_times = await connect_all(
+            devices, args.connect_concurrency
+        )
+        connect_elapsed = time.perf_counter() - started
+        protocols = [protocol for protocol, _ in connections]
+        listeners = [listener for _, listener in connections]
+
+        round_trips = []
+        updates = sum(listener.updates for listener in listeners)
+        cpu = time.process_time()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + args.duration
+        await asyncio.gather(
+            *[
+                send_commands(protocol, args.command_interval, deadline, round_trips)
+                for protocol in protocols
+            ]
+        )
+        cpu = time.process_time() - cpu
+        updates = sum(listener.updates for listener in listeners) - updates
+        heartbeats = sum(protocol.heartbeats_sent for protocol in protocols)
+        frames = len(round_trips) + updates + heartbeats
+        disconnects = sum(listener.disconnects for listener in listeners)
+    finally:
+        for protocol in protocols:
+            protocol.close()
+        process.terminate()
+        await process.wait()
+
+    return {
+        "devices": len(devices),
+        "connect_all": connect_elapsed,
+        "connect_p50": percentile(connect_times, 50),
+        "connect_p99": percentile(connect_times, 99),
+        "commands": len(round_trips),
+        "rtt_p50": percentile(round_trips, 50),
+        "rtt_p99": percentile(round_trips, 99),
+        "frames": frames,
+        "cpu_per_frame": cpu / frames if frames else 0.0,
+        "memory_per_device": allocated / len(devices) if devices else 0.0,
+        "disconnects": disconnects,
+    }
+
+
+def print_report(results):
+    """Print results in human readable form."""
+    print(f"Devices:            {results['devices']}")
+    print(f"Connect all:        {results['connect_all']:.2f} s")
+    print(
+        f"Connect time:       p50 {results['connect_p50'] * 1000:.1f} ms, "
+        f"p99 {results['connect_p99'] * 1000:.1f} ms"
+    )
+    print(
+        f"Command RTT:        p50 {results['rtt_p50'] * 1000:.2f} ms, "
+        f"p99 {results['rtt_p99'] * 1000:.2f} ms ({results['commands']} commands)"
+    )
+    print(
+        f"CPU per frame:      {results['cpu_per_frame'] * 1e6:.1f} us "
+        f"({results['frames']} frames)"
+    )
+    print(f"Memory per device:  {results['memory_per_device'] / 1024:.1f} KiB")
+    print(f"Disconnects:        {results['disconnects']}")
+
+
+def main():
+    """Run load test from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument(
+        "--duration", type=float, default=30.0, help="seconds to send commands"
+    )
+    parser.add_argument(
+        "--command-interval",
+        type=float,
+        default=5.0,
+        help="seconds between commands per device",
+    )
+    parser.add_argument(
+        "--change-interval",
+        type=float,
+        default=5.0,
+        help="seconds between datapoint changes per device, 0 to disable",
+    )
+    parser.add_argument("--connect-concurrency", type=int, default=50)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Generate device traces used by the benchmark suite.
+
+The traces reproduce the frame layout and payload shapes of traffic recorded
+from real devices, re-encoded with anonymized device ids and local keys so they
+can be shared. Each trace contains the commands sent to the device and the raw
+frames received from it once the device type has been negotiated.
+
+Run from the repository root with: python -m benchmarks.make_traces
+"""
+import json
+import struct
+from hashlib import md5
+from pathlib import Path
+
+from .loader import load_localtuya
+
+load_localtuya()
+
+from localtuya import discovery, pytuya  # noqa: E402
+
+TRACES_DIR = Path(__file__).resolve().parent / "traces"
+
+RETCODE_OK = struct.pack(">I", 0)
+
+PLUG_STATUS = {
+    "1": True,
+    "9": 0,
+    "17": 12,
+    "18": 165,
+    "19": 372,
+    "20": 2301,
+    "21": 1,
+    "22": 627,
+    "23": 29908,
+    "24": 17206,
+    "25": 1190,
+}
+
+SWITCH_STATUS = {
+    "1": True,
+    "2": False,
+    "3": True,
+    "4": False,
+    "7": 0,
+    "8": 0,
+    "9": 0,
+    "10": 0,
+    "14": "memory",
+    "15": "relay",
+}
+
+
+def _frame(seqno, cmd, payload):
+    """Return a frame as sent by a device, including return code."""
+    return pytuya.pack_message(
+        pytuya.TuyaMessage(seqno, cmd, 0, RETCODE_OK + payload, 0)
+    )
+
+
+def _encrypt_31(cipher, local_key, payload):
+    """Encrypt a payload like protocol 3.1 devices do for pushes."""
+    encrypted = cipher.encrypt(payload)
+    digest = md5(
+        b"data="
+        + encrypted
+        + b"||lpv="
+        + pytuya.PROTOCOL_VERSION_BYTES_31
+        + b"||"
+        + local_key
+    ).hexdigest()
+    return pytuya.PROTOCOL_VERSION_BYTES_31 + digest[8:][:16].encode() + encrypted
+
+
+def _json(data):
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def _power_updates(device_id, count):
+    """Return power metering pushes with slowly changing values."""
+    for i in range(count):
+        yield {
+            "devId": device_id,
+            "dps": {"18": 160 + i % 9, "19": 360 + i % 23, "20": 2295 + i % 11},
+            "t": 1605000000 + i,
+        }
+
+
+def plug_31_type_0a():
+    """Protocol 3.1 plug with plain status responses and encrypted pushes."""
+    device_id = "bf3a1c0000000000a1b2"
+    local_key = b"3f1c2e0a9b8d7c6e"
+    cipher = pytuya.AESCipher(local_key)
+
+    received = [
+        _frame(0, 0x0A, _json({"devId": device_id, "dps": PLUG_STATUS})),
+        _frame(0, 0x09, b""),
+        _frame(1, 0x07, b""),
+    ]
+    for seqno, update in enumerate(_power_updates(device_id, 20)):
+        received.append(
+            _frame(seqno, 0x08, _encrypt_31(cipher, local_key, _json(update)))
+        )
+    return {
+        "device_id": device_id,
+        "local_key": local_key.decode(),
+        "protocol_version": 3.1,
+        "dev_type": "type_0a",
+        "commands": [
+            {"command": pytuya.STATUS},
+            {"command": pytuya.HEARTBEAT},
+            {"command": pytuya.SET, "dps": {"1": False}},
+        ],
+        "received": [frame.hex() for frame in received],
+    }
+
+
+def plug_33_type_0a():
+    """Protocol 3.3 power metering plug using 0x0a status requests."""
+    device_id = "bf7e5d0000000000c3d4"
+    local_key = b"9a8b7c6d5e4f3a2b"
+    cipher = pytuya.AESCipher(local_key)
+
+    def _push(payload):
+        return pytuya.PROTOCOL_33_HEADER + cipher.encrypt(payload, False)
+
+    received = [
+        _frame(
+            0,
+            0x0A,
+            cipher.encrypt(_json({"devId": device_id, "dps": PLUG_STATUS}), False),
+        ),
+        _frame(0, 0x09, b""),
+        _frame(1, 0x07, b""),
+    ]
+    for seqno, update in enumerate(_power_updates(device_id, 20)):
+        received.append(_frame(seqno, 0x08, _push(_json(update))))
+    return {
+        "device_id": device_id,
+        "local_key": local_key.decode(),
+        "protocol_version": 3.3,
+        "dev_type": "type_0a",
+        "commands": [
+            {"command": pytuya.STATUS},
+            {"command": pytuya.HEARTBEAT},
+            {"command": pytuya.SET, "dps": {"1": False}},
+        ],
+        "received": [frame.hex() for frame in received],
+    }
+
+
+def switch_33_type_0d():
+    """Protocol 3.3 four gang switch requiring 0x0d status requests."""
+    device_id = "bf11aa22bb33cc44dd55ee"
+    local_key = b"0f1e2d3c4b5a6978"
+    cipher = pytuya.AESCipher(local_key)
+
+    def _payload(data):
+        return pytuya.PROTOCOL_33_HEADER + cipher.encrypt(_json(data), False)
+
+    received = [
+        _frame(0, 0x0D, _payload({"devId": device_id, "dps": SWITCH_STATUS})),
+        _frame(0, 0x09, b""),
+        _frame(2, 0x07, b""),
+    ]
+    for seqno in range(20):
+        gang = str(1 + seqno % 4)
+        update = {"devId": device_id, "dps": {gang: seqno % 2 == 0}, "t": seqno}
+        received.append(_frame(seqno, 0x08, _payload(update)))
+    return {
+        "device_id": device_id,
+        "local_key": local_key.decode(),
+        "protocol_version": 3.3,
+        "dev_type": "type_0d",
+        "dps_to_request": ["1", "2", "3", "4", "7", "8", "9", "10", "14", "15"],
+        "commands": [
+            {"command": pytuya.STATUS},
+            {"command": pytuya.HEARTBEAT},
+            {"command": pytuya.SET, "dps": {"1": True, "2": True}},
+        ],
+        "received": [frame.hex() for frame in received],
+    }
+
+
+def broadcast_datagram(ip, device_id, version):
+    """Return UDP broadcast of a device, encrypted for protocol 3.3 devices."""
+    device = {
+        "ip": ip,
+        "gwId": device_id,
+        "active": 2,
+        "ability": 0,
+        "mode": 0,
+        "encrypt": version == "3.3",
+        "productKey": "keyaaaaaaaaaaaaa",
+        "version": version,
+    }
+    payload = _json(device)
+    if device["encrypt"]:
+        payload = pytuya.AESCipher(discovery.UDP_KEY).encrypt(payload, False)
+    return _frame(0, 0x13, payload)
+
+
+def broadcast_datagrams(count):
+    """Return UDP broadcasts of count devices, every other one encrypted."""
+    return [
+        broadcast_datagram(
+            f"192.168.{1 + i // 200}.{100 + i % 200}",
+            f"bf{i:02d}000000000000e5f6",
+            "3.3" if i % 2 == 0 else "3.1",
+        )
+        for i in range(count)
+    ]
+
+
+def broadcasts():
+    """UDP broadcasts from 3.1 (plain) and 3.3 (encrypted) devices."""
+    return {
+        "datagrams": [datagram.hex() for datagram in broadcast_datagrams(10)],
+    }
+
+
+TRACES = {
+    "plug_31_type_0a": plug_31_type_0a,
+    "plug_33_type_0a": plug_33_type_0a,
+    "switch_33_type_0d": switch_33_type_0d,
+    "broadcasts": broadcasts,
+}
+
+
+def main():
+    """Write all traces to disk."""
+    for name, generator in TRACES.items():
+        path = TRACES_DIR / f"{name}.json"
+        trace = {"description": generator.__doc__, **generator()}
+        path.write_text(json.dumps(trace, indent=2) + "\n")
+        print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Replay a raw traffic capture through the pytuya parser and decoder.
+
+Captures are written by the start_capture service (or pytuya.TrafficCapture)
+and contain data exactly as received from the device, so the chunks fed to
+MessageDispatcher are fragmented and coalesced the same way as in production.
+Every parsed frame is decoded with TuyaProtocol._decode_payload and failures are
+reported, which makes it possible to reproduce parser bugs offline. Replay runs
+as fast as possible by default, which makes it a benchmark of decoder changes
+against real traffic, or at the original pacing with --realtime. Parsing starts
+over at every connect and disconnect record, as data of a partial frame is lost
+with the connection.
+
+Run from the repository root with:
+python -m benchmarks.replay capture.bin --device-id ID --local-key KEY
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from .loader import load_localtuya
+
+load_localtuya()
+
+from localtuya import pytuya  # noqa: E402
+
+
+class Replay:
+    """Feed captured data to a dispatcher and decode all frames."""
+
+    def __init__(self, protocol, verbose=False):
+        """Initialize a new Replay."""
+        self.protocol = protocol
+        self.verbose = verbose
+        self.stats = pytuya.ConnectionStats()
+        self.dispatcher = None
+        self.chunks_in = 0
+        self.chunks_out = 0
+        self.bytes_in = 0
+        self.connections = 0
+        self.frames = 0
+        self.errors = []
+        self.reset()
+
+    def reset(self):
+        """Start parsing anew, dropping data of a partial frame."""
+        self.dispatcher = pytuya.MessageDispatcher(
+            self.protocol.id, None, stats=self.stats
+        )
+        self.dispatcher.debug = lambda *_: None
+        # Decode every frame, not only status updates without a listener
+        self.dispatcher._dispatch = self._decode
+
+    def _decode(self, msg):
+        self.frames += 1
+        try:
+            decoded = self.protocol._decode_payload(msg.payload)
+        except Exception as ex:
+            self.errors.append((msg, ex))
+            print(f"Failed to decode {msg}: {ex!r}")
+        else:
+            if self.verbose:
+                print(f"cmd={msg.cmd:#04x} seqno={msg.seqno} {decoded}")
+
+    def feed(self, direction, data):
+        """Feed a captured chunk."""
+        if direction == pytuya.CAPTURE_IN:
+            self.chunks_in += 1
+            self.bytes_in += len(data)
+            self.dispatcher.add_data(data)
+        elif direction == pytuya.CAPTURE_OUT:
+            self.chunks_out += 1
+        else:
+            if direction == pytuya.CAPTURE_CONNECT:
+                self.connections += 1
+            self.reset()
+
+
+async def run(args):
+    """Replay capture and return results."""
+    protocol = pytuya.TuyaProtocol(
+        args.device_id,
+        args.local_key,
+        args.protocol_version,
+        asyncio.get_running_loop().create_future(),
+        pytuya.EmptyListener(),
+    )
+    protocol.debug = lambda *_: None
+    records = list(pytuya.read_capture(args.capture))
+
+    elapsed = 0.0
+    for _ in range(args.repeat):
+        # Payloads may switch device type, so every replay starts over
+        protocol.dev_type = args.dev_type
+        replay = Replay(protocol, args.verbose)
+        started = time.perf_counter()
+        for timestamp, direction, data in records:
+            if args.realtime:
+                delay = timestamp - records[0][0] - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            replay.feed(direction, data)
+        elapsed += time.perf_counter() - started
+
+    frames = replay.frames * args.repeat
+    return {
+        "records": len(records),
+        "chunks_in": replay.chunks_in,
+        "chunks_out": replay.chunks_out,
+        "bytes_in": replay.bytes_in,
+        "connections": replay.connections,
+        "frames": replay.frames,
+        "framing_errors": replay.stats.decode_errors,
+        "decode_errors": len(replay.errors),
+        "duration": records[-1][0] - records[0][0] if records else 0.0,
+        "elapsed": elapsed,
+        "time_per_frame": elapsed / frames if frames else 0.0,
+    }
+
+
+def print_report(results):
+    """Print results in human readable form."""
+    print(
+        f"Records:        {results['records']} "
+        f"({results['chunks_in']} received, {results['chunks_out']} sent)"
+    )
+    print(f"Connections:    {results['connections']}")
+    print(f"Frames:         {results['frames']} from {results['bytes_in']} bytes")
+    print(f"Framing errors: {results['framing_errors']}")
+    print(f"Decode errors:  {results['decode_errors']}")
+    print(f"Captured over:  {results['duration']:.1f} s")
+    print(
+        f"Replay time:    {results['elapsed']:.3f} s, "
+        f"{results['time_per_frame'] * 1e6:.1f} us per frame"
+    )
+
+
+def main():
+    """Replay capture from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("capture", help="capture file to replay")
+    parser.add_argument("--device-id", required=True)
+    parser.add_argument("--local-key", required=True)
+    parser.add_argument("--protocol-version", type=float, default=3.3)
+    parser.add_argument(
+        "--dev-type",
+        default="type_0a",
+        choices=["type_0a", "type_0d"],
+        help="device type the capture starts with",
+    )
+    parser.add_argument(
+        "--realtime", action="store_true", help="replay at the original pacing"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="number of times to replay"
+    )
+    parser.add_argument("--verbose", action="store_true", help="print each frame")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""Simulated Tuya devices for load testing.
+
+Every virtual device listens on its own port on the loopback interface and
+behaves like a device of its protocol version and device type: it answers
+status, set and heartbeat requests, pushes datapoint changes at a scripted rate
+and optionally sends discovery broadcasts. A quarter of the devices use
+protocol 3.1 and a quarter are type_0d devices, the rest are protocol 3.3
+type_0a devices.
+
+Run from the repository root with: python -m benchmarks.simulator --devices 100
+
+Each device is printed as a JSON object on a line of its own once listening,
+followed by a line with READY. The simulator runs until interrupted.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from .loader import load_localtuya
+
+load_localtuya()
+
+from localtuya import pytuya  # noqa: E402
+
+from .make_traces import (  # noqa: E402
+    PLUG_STATUS,
+    _encrypt_31,
+    _frame,
+    _json,
+    broadcast_datagram,
+)
+
+READY = "READY"
+
+# Power metering datapoints changed by the scripted updates
+CHANGING_DPS = ["18", "19", "20"]
+
+UNVALID_RESPONSE = b"data unvalid"
+
+
+class VirtualDevice:
+    """Simulated device accepting any number of connections."""
+
+    def __init__(
+        self, device_id, local_key, version=3.3, dev_type="type_0a", change_interval=0
+    ):
+        """Initialize a new VirtualDevice."""
+        self.device_id = device_id
+        self.local_key = local_key
+        self.version = version
+        self.dev_type = dev_type
+        self.change_interval = change_interval
+        self.status = dict(PLUG_STATUS)
+        self.cipher = pytuya.AESCipher(local_key)
+        self.connections = set()
+        self.frames_received = 0
+        self.port = None
+        self._server = None
+        self._changer = None
+        self._seqno = 0
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Start listening for connections."""
+        loop = asyncio.get_running_loop()
+        self._server = await loop.create_server(
+            lambda: DeviceConnection(self), host, port
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        if self.change_interval > 0:
+            self._changer = loop.create_task(self._change_datapoints())
+
+    def close(self):
+        """Stop device and close all connections."""
+        if self._changer is not None:
+            self._changer.cancel()
+        self._server.close()
+        for connection in list(self.connections):
+            connection.transport.close()
+
+    def describe(self):
+        """Return what a client needs to know to connect to the device."""
+        return {
+            "device_id": self.device_id,
+            "local_key": self.local_key.decode(),
+            "protocol_version": self.version,
+            "dev_type": self.dev_type,
+            "port": self.port,
+        }
+
+    async def _change_datapoints(self):
+        # Start at a random offset so that devices do not change in lockstep
+        await asyncio.sleep(random.uniform(0, self.change_interval))
+        while True:
+            dp = random.choice(CHANGING_DPS)
+            self.status[dp] = random.randrange(3000)
+            self.push({dp: self.status[dp]})
+            await asyncio.sleep(self.change_interval)
+
+    def push(self, dps):
+        """Send changed datapoints to all connected clients."""
+        update = {"devId": self.device_id, "dps": dps, "t": int(time.time())}
+        if self.version == 3.3:
+            payload = pytuya.PROTOCOL_33_HEADER + self.cipher.encrypt(
+                _json(update), False
+            )
+        else:
+            payload = _encrypt_31(self.cipher, self.local_key, _json(update))
+
+        self._seqno += 1
+        frame = _frame(self._seqno, 0x08, payload)
+        for connection in self.connections:
+            connection.transport.write(frame)
+
+    def handle(self, seqno, cmd, payload):
+        """Handle a request and return frames to send back."""
+        self.frames_received += 1
+        if cmd == 0x09:
+            return [_frame(seqno, cmd, b"")]
+
+        request = self._decrypt(cmd, payload)
+        if cmd in (0x0A, 0x0D):
+            return [_frame(seqno, cmd, self._status_response(cmd, request))]
+        if cmd == 0x07:
+            changed = {
+                dp: value
+                for dp, value in request["dps"].items()
+                if self.status.get(dp) != value
+            }
+            self.status.update(changed)
+            if changed:
+                asyncio.get_running_loop().call_soon(self.push, changed)
+            return [_frame(seqno, cmd, b"")]
+        return []
+
+    def _decrypt(self, cmd, payload):
+        if self.version == 3.3:
+            if cmd != 0x0A:
+                payload = payload[len(pytuya.PROTOCOL_33_HEADER) :]
+            payload = self.cipher.decrypt(payload, False)
+        elif cmd == 0x07:
+            # Skip version and MD5 digest, remaining payload is base64 encoded
+            payload = self.cipher.decrypt(payload[19:])
+        return json.loads(payload)
+
+    def _status_response(self, cmd, request):
+        if self.dev_type == "type_0d":
+            if cmd == 0x0A:
+                return self.cipher.encrypt(UNVALID_RESPONSE, False)
+            dps = {dp: self.status[dp] for dp in request["dps"] if dp in self.status}
+        else:
+            dps = self.status
+
+        payload = _json({"devId": self.device_id, "dps": dps})
+        if self.version == 3.1:
+            return payload
+        if cmd == 0x0A:
+            return self.cipher.encrypt(payload, False)
+        return pytuya.PROTOCOL_33_HEADER + self.cipher.encrypt(payload, False)
+
+
+class DeviceConnection(asyncio.Protocol):
+    """Connection from a client to a virtual device."""
+
+    def __init__(self, device):
+        """Initialize a new DeviceConnection."""
+        self.device = device
+        self.transport = None
+        self.buffer = b""
+
+    def connection_made(self, transport):
+        """Client connected."""
+        self.transport = transport
+        self.device.connections.add(self)
+
+    def connection_lost(self, exc):
+        """Client disconnected."""
+        self.device.connections.discard(self)
+
+    def data_received(self, data):
+        """Parse requests and send responses."""
+        self.buffer += data
+        header_size = pytuya.MESSAGE_HEADER.size
+        while len(self.buffer) >= header_size:
+            _, seqno, cmd, length = pytuya.MESSAGE_HEADER.unpack_from(self.buffer)
+            end = header_size + length
+            if len(self.buffer) < end:
+                break
+
+            payload = self.buffer[header_size : end - pytuya.MESSAGE_END.size]
+            self.buffer = self.buffer[end:]
+            for frame in self.device.handle(seqno, cmd, payload):
+                self.transport.write(frame)
+
+
+def create_fleet(count, change_interval=0, seed=0):
+    """Create count virtual devices with deterministic ids and keys."""
+    rand = random.Random(seed)
+    devices = []
+    for i in range(count):
+        local_key = "".join(rand.choice("0123456789abcdef") for _ in range(16))
+        devices.append(
+            VirtualDevice(
+                f"bf{i:018d}",
+                local_key.encode(),
+                version=3.1 if i % 4 == 3 else 3.3,
+                dev_type="type_0d" if i % 4 == 2 else "type_0a",
+                change_interval=change_interval,
+            )
+        )
+    return devices
+
+
+async def broadcast(devices, interval, host):
+    """Send discovery broadcasts for all devices every interval seconds."""
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        asyncio.DatagramProtocol, local_addr=("0.0.0.0", 0)
+    )
+    datagrams = [
+        (
+            broadcast_datagram("127.0.0.1", device.device_id, str(device.version)),
+            6667 if device.version == 3.3 else 6666,
+        )
+        for device in devices
+    ]
+    try:
+        while True:
+            for datagram, port in datagrams:
+                transport.sendto(datagram, (host, port))
+            await asyncio.sleep(interval)
+    finally:
+        transport.close()
+
+
+async def run(args):
+    """Start the fleet and run until cancelled."""
+    devices = create_fleet(args.devices, args.change_interval, args.seed)
+    await asyncio.gather(*[device.start() for device in devices])
+    for device in devices:
+        print(json.dumps(device.describe()))
+    print(READY, flush=True)
+
+    try:
+        if args.broadcast_interval > 0:
+            await broadcast(devices, args.broadcast_interval, args.broadcast_host)
+        else:
+            await asyncio.Event().wait()
+    finally:
+        for device in devices:
+            device.close()
+
+
+def main():
+    """Run simulator from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument(
+        "--change-interval",
+        type=float,
+        default=5.0,
+        help="seconds between datapoint changes per device, 0 to disable",
+    )
+    parser.add_argument(
+        "--broadcast-interval",
+        type=float,
+        default=0.0,
+        help="seconds between discovery broadcasts, 0 to disable",
+    )
+    parser.add_argument("--broadcast-host", default="127.0.0.1")
+    parser.add_argument("--seed", type=int, default=0)
+    try:
+        asyncio.run(run(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Benchmarks for encoding and decoding of pytuya messages."""
+from .conftest import load_trace
+from localtuya import discovery, pytuya
+
+FRAGMENT_SIZE = 64
+
+
+def test_pack_message(benchmark, protocol, trace):
+    """Benchmark packing of the commands in a trace."""
+    messages = [
+        pytuya.unpack_message(
+            protocol._generate_payload(command["command"], command.get("dps"))
+        )
+        for command in trace["commands"]
+    ]
+
+    def _pack():
+        for msg in messages:
+            pytuya.pack_message(msg)
+
+    benchmark(_pack)
+
+
+def test_unpack_message(benchmark, received):
+    """Benchmark unpacking of all frames received in a trace."""
+
+    def _unpack():
+        for frame in received:
+            pytuya.unpack_message(frame)
+
+    benchmark(_unpack)
+
+
+def test_add_data_coalesced(benchmark, trace, received):
+    """Benchmark parsing a trace received in a single read."""
+    data = b"".join(received)
+
+    def _add_data():
+        dispatcher = pytuya.MessageDispatcher(trace["device_id"], lambda msg: None)
+        dispatcher.add_data(data)
+
+    benchmark(_add_data)
+
+
+def test_add_data_fragmented(benchmark, trace, received):
+    """Benchmark parsing a trace received in small reads."""
+    data = b"".join(received)
+    chunks = [
+        data[pos : pos + FRAGMENT_SIZE] for pos in range(0, len(data), FRAGMENT_SIZE)
+    ]
+
+    def _add_data():
+        dispatcher = pytuya.MessageDispatcher(trace["device_id"], lambda msg: None)
+        for chunk in chunks:
+            dispatcher.add_data(chunk)
+
+    benchmark(_add_data)
+
+
+def test_decode_payload(benchmark, protocol, messages):
+    """Benchmark decoding of all payloads received in a trace."""
+
+    def _decode():
+        for msg in messages:
+            protocol._decode_payload(msg.payload)
+
+    benchmark(_decode)
+
+
+def test_generate_payload(benchmark, protocol, trace):
+    """Benchmark generating the commands in a trace."""
+    commands = [
+        (command["command"], command.get("dps")) for command in trace["commands"]
+    ]
+
+    def _generate():
+        for command, dps in commands:
+            protocol._generate_payload(command, dps)
+
+    benchmark(_generate)
+
+
+def test_decrypt_udp(benchmark):
+    """Benchmark decryption of encrypted discovery broadcasts."""
+    datagrams = [
+        bytes.fromhex(datagram)[20:-8]
+        for datagram in load_trace("broadcasts")["datagrams"]
+    ]
+    encrypted = [datagram for datagram in datagrams if not datagram.startswith(b"{")]
+
+    def _decrypt():
+        for datagram in encrypted:
+            discovery.decrypt_udp(datagram)
+
+    benchmark(_decrypt)
@@ -0,0 +1,40 @@
+"""Benchmarks for handling of discovery broadcasts."""
+import pytest
+
+from .make_traces import broadcast_datagrams
+from localtuya import discovery
+
+# Every device broadcasts about once per five seconds, so one round of
+# broadcasts corresponds to five seconds of traffic
+FLEET_SIZE = 500
+
+
+@pytest.fixture(scope="module")
+def fleet():
+    """One broadcast from each device in a large installation."""
+    return broadcast_datagrams(FLEET_SIZE)
+
+
+def test_broadcasts_uncached(benchmark, fleet):
+    """Benchmark first broadcast of every device, all of them decoded."""
+
+    def _receive():
+        listener = discovery.TuyaDiscovery()
+        for datagram in fleet:
+            listener.datagram_received(datagram, None)
+
+    benchmark(_receive)
+
+
+def test_broadcasts_cached(benchmark, fleet):
+    """Benchmark repeated broadcasts of every device, served from cache."""
+    listener = discovery.TuyaDiscovery()
+    for datagram in fleet:
+        listener.datagram_received(datagram, None)
+
+    def _receive():
+        for datagram in fleet:
+            listener.datagram_received(datagram, None)
+
+    benchmark(_receive)
+    assert listener.cache_hits > 0
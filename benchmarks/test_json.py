@@ -0,0 +1,41 @@
+"""Benchmarks comparing JSON backends on payloads from device traces."""
+import pytest
+
+from localtuya import pytuya
+
+CODECS = sorted(pytuya.JSON_CODECS)
+
+
+@pytest.fixture(params=CODECS)
+def codec(request):
+    """JSON codec to benchmark."""
+    return pytuya.JSON_CODECS[request.param]
+
+
+@pytest.fixture
+def payloads(protocol, messages):
+    """Decrypted JSON payloads received in a trace."""
+    decoded = [protocol._decode_payload(msg.payload) for msg in messages]
+    return [pytuya.JSON_CODECS["json"].dumps(payload) for payload in decoded]
+
+
+def test_loads(benchmark, codec, payloads):
+    """Benchmark decoding of payloads received from device."""
+
+    def _loads():
+        for payload in payloads:
+            codec.loads(payload)
+
+    benchmark(_loads)
+
+
+def test_dumps(benchmark, codec, trace):
+    """Benchmark encoding of dps sent to device."""
+    dps = [command["dps"] for command in trace["commands"] if "dps" in command]
+    dps.append({str(dp): None for dp in trace.get("dps_to_request", range(1, 21))})
+
+    def _dumps():
+        for data in dps:
+            codec.dumps(data)
+
+    benchmark(_dumps)
@@ -9,6 +9,9 @@ localtuya:
     local_key: xxxxx
     friendly_name: Tuya Device
     protocol_version: "3.3"
+    write_window: 0.05 # Optional, seconds to merge writes into one command
+    heartbeat_interval: 20 # Optional, seconds without traffic before heartbeat
+    connect_timeout: 5 # Optional, seconds to wait for a connection
     entities:
       - platform: binary_sensor
         friendly_name: Plug Status
@@ -46,6 +49,10 @@ localtuya:
         scaling: 0.1 # Optional
         device_class: voltage # Optional
         unit_of_measurement: "V" # Optional
+        deadband: 1 # Optional, ignore changes smaller than this
+        deadband_percent: 2 # Optional, ignore changes smaller than this in %
+        min_interval: 10 # Optional, seconds between state updates
+        max_interval: 300 # Optional, update also small changes after this
 
       - platform: switch
         friendly_name: Plug
@@ -53,13 +60,29 @@ localtuya:
         current: 18 # Optional
         current_consumption: 19 # Optional
         voltage: 20 # Optional
+        average_window: 60 # Optional, seconds to average power readings over
+
+Settings shared by all devices require the devices to be listed under a
+devices key:
+
+localtuya:
+  connection_limit: 4 # Optional, devices connecting at the same time
+  connection_ramp: 2 # Optional, new connections started per second
+  devices:
+    - host: 192.168.1.x
+      ...
 """
 import asyncio
+import json
 import logging
 
+import homeassistant.helpers.config_validation as cv
+import voluptuous as vol
+from homeassistant.components.sensor import DOMAIN as SENSOR_DOMAIN
 from homeassistant.config_entries import SOURCE_IMPORT, ConfigEntry
 from homeassistant.const import (
     CONF_DEVICE_ID,
+    CONF_DEVICES,
     CONF_ENTITIES,
     CONF_HOST,
     CONF_PLATFORM,
@@ -69,9 +92,29 @@ from homeassistant.const import (
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.reload import async_integration_yaml_config
 
-from .common import TuyaDevice
+from . import pytuya
+from .common import ConnectionAdmission, DeviceStore, TuyaDevice
 from .config_flow import config_schema
-from .const import CONF_PRODUCT_KEY, DATA_DISCOVERY, DOMAIN, TUYA_DEVICE
+from .const import (
+    ATTR_INCLUDE_PAYLOADS,
+    CAPTURE_FILE,
+    CONF_CONNECTION_LIMIT,
+    CONF_CONNECTION_RAMP,
+    CONF_LOCAL_KEY,
+    CONF_PRODUCT_KEY,
+    DATA_ADMISSION,
+    DATA_DEVICE_ENTRIES,
+    DATA_DISCOVERY,
+    DATA_STORE,
+    DEFAULT_CONNECTION_LIMIT,
+    DEFAULT_CONNECTION_RAMP,
+    DIAGNOSTICS_FILE,
+    DOMAIN,
+    SERVICE_DUMP_DIAGNOSTICS,
+    SERVICE_START_CAPTURE,
+    SERVICE_STOP_CAPTURE,
+    TUYA_DEVICE,
+)
 from .discovery import TuyaDiscovery
 
 _LOGGER = logging.getLogger(__name__)
@@ -80,6 +123,16 @@ UNSUB_LISTENER = "unsub_listener"
 
 CONFIG_SCHEMA = config_schema()
 
+DUMP_DIAGNOSTICS_SCHEMA = vol.Schema(
+    {vol.Optional(ATTR_INCLUDE_PAYLOADS, default=False): cv.boolean}
+)
+
+CAPTURE_SCHEMA = vol.Schema({vol.Required(CONF_DEVICE_ID): cv.string})
+
+DIAGNOSTICS_TO_REDACT = {CONF_LOCAL_KEY}
+
+REDACTED = "**REDACTED**"
+
 
 @callback
 def _async_update_config_entry_if_from_yaml(hass, entries_by_id, conf):
@@ -95,7 +148,25 @@ async def async_setup(hass: HomeAssistant, config: dict):
     """Set up the LocalTuya integration component."""
     hass.data.setdefault(DOMAIN, {})
 
-    device_cache = {}
+    # Config entries by device id, kept up to date when entries are set up
+    # (which they also are after being updated) and removed
+    device_entries = {
+        entry.data[CONF_DEVICE_ID]: entry
+        for entry in hass.config_entries.async_entries(DOMAIN)
+    }
+    hass.data[DOMAIN][DATA_DEVICE_ENTRIES] = device_entries
+
+    conf = config.get(DOMAIN, {})
+    hass.data[DOMAIN][DATA_ADMISSION] = ConnectionAdmission(
+        hass,
+        conf.get(CONF_CONNECTION_LIMIT, DEFAULT_CONNECTION_LIMIT),
+        conf.get(CONF_CONNECTION_RAMP, DEFAULT_CONNECTION_RAMP),
+        list(device_entries),
+    )
+
+    store = DeviceStore(hass)
+    await store.async_load()
+    hass.data[DOMAIN][DATA_STORE] = store
 
     async def _handle_reload(service):
         """Handle reload service call."""
@@ -107,7 +178,11 @@ async def async_setup(hass: HomeAssistant, config: dict):
         current_entries = hass.config_entries.async_entries(DOMAIN)
         entries_by_id = {entry.data[CONF_DEVICE_ID]: entry for entry in current_entries}
 
-        for conf in config[DOMAIN]:
+        hass.data[DOMAIN][DATA_ADMISSION].configure(
+            config[DOMAIN][CONF_CONNECTION_LIMIT], config[DOMAIN][CONF_CONNECTION_RAMP]
+        )
+
+        for conf in config[DOMAIN][CONF_DEVICES]:
             _async_update_config_entry_if_from_yaml(hass, entries_by_id, conf)
 
         reload_tasks = [
@@ -117,40 +192,20 @@ async def async_setup(hass: HomeAssistant, config: dict):
 
         await asyncio.gather(*reload_tasks)
 
-    def _entry_by_device_id(device_id):
-        """Look up config entry by device id."""
-        current_entries = hass.config_entries.async_entries(DOMAIN)
-        for entry in current_entries:
-            if entry.data[CONF_DEVICE_ID] == device_id:
-                return entry
-        return None
-
     def _device_discovered(device):
         """Update address of device if it has changed."""
         device_ip = device["ip"]
         device_id = device["gwId"]
         product_key = device["productKey"]
 
-        # If device is not in cache, check if a config entry exists
-        if device_id not in device_cache:
-            entry = _entry_by_device_id(device_id)
-            if entry:
-                # Save address from config entry in cache to trigger
-                # potential update below
-                device_cache[device_id] = entry.data[CONF_HOST]
-
-        if device_id not in device_cache:
-            return
-
-        entry = _entry_by_device_id(device_id)
+        entry = device_entries.get(device_id)
         if entry is None:
             return
 
         updates = {}
 
-        if device_cache[device_id] != device_ip:
+        if entry.data[CONF_HOST] != device_ip:
             updates[CONF_HOST] = device_ip
-            device_cache[device_id] = device_ip
 
         if entry.data.get(CONF_PRODUCT_KEY) != product_key:
             updates[CONF_PRODUCT_KEY] = product_key
@@ -160,6 +215,11 @@ async def async_setup(hass: HomeAssistant, config: dict):
             hass.config_entries.async_update_entry(
                 entry, data={**entry.data, **updates}
             )
+            return
+
+        # Device is back on the network, e.g. after a power cut
+        if entry.entry_id in hass.data[DOMAIN]:
+            hass.data[DOMAIN][entry.entry_id][TUYA_DEVICE].async_device_seen()
 
     discovery = TuyaDiscovery(_device_discovered)
 
@@ -180,7 +240,67 @@ async def async_setup(hass: HomeAssistant, config: dict):
         _handle_reload,
     )
 
-    for host_config in config.get(DOMAIN, []):
+    async def _handle_dump_diagnostics(service):
+        """Write diagnostics of all devices to a file."""
+        include_payloads = service.data[ATTR_INCLUDE_PAYLOADS]
+        devices = {
+            entry.data[CONF_DEVICE_ID]: config_entry_diagnostics(
+                hass, entry, include_payloads
+            )
+            for entry in hass.config_entries.async_entries(DOMAIN)
+        }
+        diagnostics = {
+            "timer_scheduler": pytuya.get_timer_scheduler().lag_stats(),
+            "devices": devices,
+        }
+        path = hass.config.path(DIAGNOSTICS_FILE)
+        await hass.async_add_executor_job(_write_json, path, diagnostics)
+        _LOGGER.info("Wrote diagnostics of %d devices to %s", len(devices), path)
+
+    hass.helpers.service.async_register_admin_service(
+        DOMAIN,
+        SERVICE_DUMP_DIAGNOSTICS,
+        _handle_dump_diagnostics,
+        schema=DUMP_DIAGNOSTICS_SCHEMA,
+    )
+
+    def _set_up_device(device_id):
+        entry = device_entries.get(device_id)
+        if entry is None or entry.entry_id not in hass.data[DOMAIN]:
+            _LOGGER.error("Device %s is not set up", device_id)
+            return None
+        return hass.data[DOMAIN][entry.entry_id][TUYA_DEVICE]
+
+    async def _handle_start_capture(service):
+        """Start writing raw traffic of a device to a capture file."""
+        device_id = service.data[CONF_DEVICE_ID]
+        device = _set_up_device(device_id)
+        if device is not None:
+            path = await device.async_start_capture(
+                hass.config.path(CAPTURE_FILE.format(device_id))
+            )
+            _LOGGER.info("Capturing traffic of %s to %s", device_id, path)
+
+    async def _handle_stop_capture(service):
+        """Stop writing raw traffic of a device."""
+        device = _set_up_device(service.data[CONF_DEVICE_ID])
+        if device is not None:
+            await device.async_stop_capture()
+
+    hass.helpers.service.async_register_admin_service(
+        DOMAIN,
+        SERVICE_START_CAPTURE,
+        _handle_start_capture,
+        schema=CAPTURE_SCHEMA,
+    )
+    hass.helpers.service.async_register_admin_service(
+        DOMAIN,
+        SERVICE_STOP_CAPTURE,
+        _handle_stop_capture,
+        schema=CAPTURE_SCHEMA,
+    )
+
+    for host_config in conf.get(CONF_DEVICES, []):
         hass.async_create_task(
             hass.config_entries.flow.async_init(
                 DOMAIN, context={"source": SOURCE_IMPORT}, data=host_config
@@ -190,10 +310,39 @@ async def async_setup(hass: HomeAssistant, config: dict):
     return True
 
 
+def config_entry_diagnostics(hass, entry, include_payloads=False):
+    """Return diagnostics for a config entry, optionally with frame payloads."""
+    diagnostics = {
+        "entry": {
+            key: REDACTED if key in DIAGNOSTICS_TO_REDACT else value
+            for key, value in entry.data.items()
+        },
+    }
+    if entry.entry_id in hass.data[DOMAIN]:
+        device = hass.data[DOMAIN][entry.entry_id][TUYA_DEVICE]
+        diagnostics["device"] = device.diagnostics(include_payloads)
+    return diagnostics
+
+
+def _write_json(path, data):
+    with open(path, "w") as fh:
+        json.dump(data, fh, indent=2)
+
+
+def _entry_platforms(entry):
+    """Return platforms used by a config entry."""
+    # Sensor platform also provides diagnostic sensors for every device
+    return {entity[CONF_PLATFORM] for entity in entry.data[CONF_ENTITIES]} | {
+        SENSOR_DOMAIN
+    }
+
+
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Set up LocalTuya integration from a config entry."""
     unsub_listener = entry.add_update_listener(update_listener)
 
+    hass.data[DOMAIN][DATA_DEVICE_ENTRIES][entry.data[CONF_DEVICE_ID]] = entry
+
     device = TuyaDevice(hass, entry.data)
 
     hass.data[DOMAIN][entry.entry_id] = {
@@ -202,11 +351,10 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     }
 
     async def setup_entities():
-        platforms = set(entity[CONF_PLATFORM] for entity in entry.data[CONF_ENTITIES])
         await asyncio.gather(
             *[
                 hass.config_entries.async_forward_entry_setup(entry, platform)
-                for platform in platforms
+                for platform in _entry_platforms(entry)
             ]
         )
         device.connect()
@@ -222,15 +370,14 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
         await asyncio.gather(
             *[
                 hass.config_entries.async_forward_entry_unload(entry, component)
-                for component in set(
-                    entity[CONF_PLATFORM] for entity in entry.data[CONF_ENTITIES]
-                )
+                for component in _entry_platforms(entry)
             ]
         )
     )
 
     hass.data[DOMAIN][entry.entry_id][UNSUB_LISTENER]()
     hass.data[DOMAIN][entry.entry_id][TUYA_DEVICE].close()
+    hass.data[DOMAIN][DATA_ADMISSION].forget(entry.data[CONF_DEVICE_ID])
     if unload_ok:
         hass.data[DOMAIN].pop(entry.entry_id)
 
@@ -240,3 +387,9 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
 async def update_listener(hass, config_entry):
     """Update listener."""
     await hass.config_entries.async_reload(config_entry.entry_id)
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry):
+    """Remove stored data of a removed config entry."""
+    hass.data[DOMAIN][DATA_DEVICE_ENTRIES].pop(entry.data[CONF_DEVICE_ID], None)
+    hass.data[DOMAIN][DATA_STORE].async_remove(entry.data[CONF_DEVICE_ID])
@@ -1,6 +1,9 @@
 """Code shared between all platforms."""
 import asyncio
+import heapq
+import itertools
 import logging
+from contextlib import asynccontextmanager
 from random import randrange
 
 from homeassistant.const import (
@@ -12,17 +15,22 @@ from homeassistant.const import (
     CONF_PLATFORM,
 )
 from homeassistant.core import callback
-from homeassistant.helpers.dispatcher import (
-    async_dispatcher_connect,
-    async_dispatcher_send,
-)
 from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.storage import Store
 
 from . import pytuya
 from .const import (
+    CONF_CONNECT_TIMEOUT,
+    CONF_HEARTBEAT_INTERVAL,
     CONF_LOCAL_KEY,
     CONF_PRODUCT_KEY,
     CONF_PROTOCOL_VERSION,
+    CONF_WRITE_WINDOW,
+    DATA_ADMISSION,
+    DATA_STORE,
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_HEARTBEAT_INTERVAL,
+    DEFAULT_WRITE_WINDOW,
     DOMAIN,
     TUYA_DEVICE,
 )
@@ -31,6 +39,18 @@ _LOGGER = logging.getLogger(__name__)
 
 BACKOFF_TIME_UPPER_LIMIT = 300  # Five minutes
 
+# Minimum seconds between connection attempts triggered by discovery
+DISCOVERY_RECONNECT_INTERVAL = 15
+
+# Seconds between writing captured traffic buffered in memory to the file
+CAPTURE_FLUSH_INTERVAL = 1
+
+STORAGE_KEY = DOMAIN
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = 30
+
+AUTOMATION_DOMAIN = "automation"
+
 
 def prepare_setup_entities(hass, config_entry, platform):
     """Prepare ro setup entities for a platform."""
@@ -75,12 +95,27 @@ async def async_setup_entry(
                 tuyainterface,
                 config_entry,
                 device_config[CONF_ID],
+                dps_config_fields=dps_config_fields,
             )
         )
 
     async_add_entities(entities)
 
 
+def device_info(config_entry):
+    """Return device information for the device registry."""
+    return {
+        "identifiers": {
+            # Serial numbers are unique identifiers within a specific domain
+            (DOMAIN, f"local_{config_entry.data[CONF_DEVICE_ID]}")
+        },
+        "name": config_entry.data[CONF_FRIENDLY_NAME],
+        "manufacturer": "Unknown",
+        "model": config_entry.data.get(CONF_PRODUCT_KEY, "Tuya generic"),
+        "sw_version": config_entry.data[CONF_PROTOCOL_VERSION],
+    }
+
+
 def get_dps_for_platform(flow_schema):
     """Return config keys for all platform keys that depends on a datapoint."""
     for key, value in flow_schema(None).items():
@@ -96,6 +131,164 @@ def get_entity_config(config_entry, dp_id):
     raise Exception(f"missing entity config for id {dp_id}")
 
 
+class ConnectionAdmission:
+    """Admission control for connecting to devices.
+
+    At most limit devices set up their connection at the same time and new
+    connections are started at most ramp times per second (0 disables the
+    ramp). Waiting devices with a lower priority value are admitted first.
+    """
+
+    def __init__(self, hass, limit, ramp, expected=()):
+        """Initialize a new ConnectionAdmission."""
+        self._hass = hass
+        self.limit = limit
+        self.ramp = ramp
+        self.startup_time = None
+        self._active = 0
+        self._waiters = []
+        self._order = itertools.count()
+        self._last_admitted = None
+        self._pump_handle = None
+        self._started = hass.loop.time()
+        self._expected = set(expected)
+        self._startup_devices = len(self._expected)
+
+    def configure(self, limit, ramp):
+        """Change limits, e.g. after configuration was reloaded."""
+        self.limit = limit
+        self.ramp = ramp
+        self._pump()
+
+    @asynccontextmanager
+    async def slot(self, priority):
+        """Wait until a connection may be set up and hold the slot meanwhile."""
+        future = self._hass.loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        self._pump()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Slot might have been handed out right before being cancelled
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        self._active -= 1
+        self._pump()
+
+    def _pump(self):
+        if self._pump_handle is not None:
+            self._pump_handle.cancel()
+            self._pump_handle = None
+
+        loop = self._hass.loop
+        while self._waiters and self._active < self.limit:
+            future = self._waiters[0][2]
+            if future.done():
+                # Cancelled while waiting
+                heapq.heappop(self._waiters)
+                continue
+
+            now = loop.time()
+            if self._last_admitted is not None and self.ramp > 0:
+                delay = self._last_admitted + 1 / self.ramp - now
+                if delay > 0:
+                    self._pump_handle = loop.call_later(delay, self._pump)
+                    return
+
+            heapq.heappop(self._waiters)
+            self._active += 1
+            self._last_admitted = now
+            future.set_result(None)
+
+    def connected(self, device_id):
+        """Report that a device has connected."""
+        self._expected.discard(device_id)
+        self._check_startup()
+
+    def forget(self, device_id):
+        """Stop waiting for a device that was unloaded."""
+        self._expected.discard(device_id)
+        self._check_startup()
+
+    def _check_startup(self):
+        if self.startup_time is not None or self._expected:
+            return
+
+        self.startup_time = self._hass.loop.time() - self._started
+        if self._startup_devices:
+            _LOGGER.info(
+                "All %d devices connected %.1f seconds after startup",
+                self._startup_devices,
+                self.startup_time,
+            )
+
+
+class DeviceStore:
+    """Persistent storage of last known device status and protocol fingerprint.
+
+    Saves are batched: after an update a single delayed save is scheduled and
+    further updates only modify the data in memory until it has been written.
+    """
+
+    def __init__(self, hass):
+        """Initialize a new DeviceStore."""
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._devices = {}
+        self._save_pending = False
+
+    async def async_load(self):
+        """Load stored data."""
+        data = await self._store.async_load()
+        if data:
+            self._devices = data["devices"]
+
+    def status(self, device_id):
+        """Return last known status of a device."""
+        return self._devices.get(device_id, {}).get("status", {})
+
+    @callback
+    def async_update_status(self, device_id, status):
+        """Store status of a device."""
+        self._devices.setdefault(device_id, {})["status"] = status
+        self._schedule_save()
+
+    def fingerprint(self, device_id):
+        """Return protocol fingerprint of a device, None if not known."""
+        return self._devices.get(device_id, {}).get("fingerprint")
+
+    @callback
+    def async_update_fingerprint(self, device_id, fingerprint):
+        """Store protocol fingerprint of a device, None to forget it."""
+        device = self._devices.setdefault(device_id, {})
+        if device.get("fingerprint") != fingerprint:
+            device["fingerprint"] = fingerprint
+            self._schedule_save()
+
+    @callback
+    def async_remove(self, device_id):
+        """Remove everything stored for a device."""
+        if self._devices.pop(device_id, None) is not None:
+            self._schedule_save()
+
+    def _schedule_save(self):
+        if not self._save_pending:
+            self._save_pending = True
+            self._store.async_delay_save(self._data_to_save, STORAGE_SAVE_DELAY)
+
+    @callback
+    def _data_to_save(self):
+        self._save_pending = False
+        return {"devices": self._devices}
+
+
 class TuyaDevice(pytuya.TuyaListener, pytuya.ContextualLogger):
     """Cache wrapper for pytuya.TuyaInterface."""
 
@@ -104,11 +297,35 @@ class TuyaDevice(pytuya.TuyaListener, pytuya.ContextualLogger):
         self._hass = hass
         self._config_entry = config_entry
         self._interface = None
-        self._status = {}
+        self._store = hass.data[DOMAIN][DATA_STORE]
+        self._status = dict(self._store.status(config_entry[CONF_DEVICE_ID]))
+        self._is_stale = bool(self._status)
         self._dps_to_request = {}
         self._is_closing = False
         self._connect_task = None
+        self._reconnect_timer = None
         self._connection_attempts = 0
+        self._disconnected_at = None
+        self._last_attempt = 0.0
+        self.last_recovery_time = None
+        self.discovery_wakeups = 0
+        self.connect_latency = pytuya.QueueStats()
+        self.connect_failures = 0
+        self.connect_timeouts = 0
+        self.reconnects = 0
+        self.suppressed_updates = 0
+        self.stats = pytuya.ConnectionStats()
+        self.recorder = pytuya.FlightRecorder()
+        self._capture = None
+        self._capture_timer = None
+        self._capture_lock = asyncio.Lock()
+        self._subscribers = {}
+        self._entity_ids = set()
+        self._write_window = config_entry.get(CONF_WRITE_WINDOW, DEFAULT_WRITE_WINDOW)
+        self._pending_dps = {}
+        self._pending_writes = []
+        self._flush_handle = None
+        self._write_lock = asyncio.Lock()
         self.set_logger(_LOGGER, config_entry[CONF_DEVICE_ID])
 
         # This has to be done in case the device type is type_0d
@@ -117,104 +334,398 @@ class TuyaDevice(pytuya.TuyaListener, pytuya.ContextualLogger):
 
     def connect(self):
         """Connet to device if not already connected."""
-        if not self._is_closing and self._connect_task is None and not self._interface:
+        if (
+            not self._is_closing
+            and self._connect_task is None
+            and self._reconnect_timer is None
+            and not self._interface
+        ):
+            backoff = min(
+                randrange(2 ** self._connection_attempts), BACKOFF_TIME_UPPER_LIMIT
+            )
             self.debug(
-                "Connecting to %s",
+                "Connecting to %s in %d seconds",
                 self._config_entry[CONF_HOST],
+                backoff,
+            )
+            self._reconnect_timer = pytuya.get_timer_scheduler().call_later(
+                backoff, self._start_connection
             )
-            self._connect_task = asyncio.ensure_future(self._make_connection())
         else:
             self.debug(
                 "Already connecting to %s (%s) - %s, %s, %s",
                 self._config_entry[CONF_HOST],
                 self._config_entry[CONF_DEVICE_ID],
                 self._is_closing,
-                self._connect_task,
+                self._connect_task or self._reconnect_timer,
                 self._interface,
             )
 
-    async def _make_connection(self):
-        backoff = min(
-            randrange(2 ** self._connection_attempts), BACKOFF_TIME_UPPER_LIMIT
-        )
-
-        self.debug("Waiting %d seconds before connecting", backoff)
-        await asyncio.sleep(backoff)
+    def _start_connection(self):
+        self._reconnect_timer = None
+        self._last_attempt = self._hass.loop.time()
+        if not self._is_closing:
+            self._connect_task = asyncio.ensure_future(self._make_connection())
 
-        try:
-            self.debug("Connecting to %s", self._config_entry[CONF_HOST])
-            self._interface = await pytuya.connect(
-                self._config_entry[CONF_HOST],
-                self._config_entry[CONF_DEVICE_ID],
-                self._config_entry[CONF_LOCAL_KEY],
-                float(self._config_entry[CONF_PROTOCOL_VERSION]),
-                self,
-            )
-            self._interface.add_dps_to_request(self._dps_to_request)
+    @callback
+    def async_device_seen(self):
+        """Device broadcasted its presence, skip remaining backoff if waiting.
 
-            self.debug("Retrieving initial state")
-            status = await self._interface.status()
-            if status is None:
-                raise Exception("Failed to retrieve status")
+        Only done for devices that have been connected before and not more often
+        than every DISCOVERY_RECONNECT_INTERVAL, so a device that broadcasts but
+        refuses connections still backs off.
+        """
+        if (
+            self._reconnect_timer is None
+            or self._is_closing
+            or self._disconnected_at is None
+            or self._hass.loop.time() - self._last_attempt
+            < DISCOVERY_RECONNECT_INTERVAL
+        ):
+            return
+
+        self.debug("Device was discovered, reconnecting immediately")
+        self._reconnect_timer.cancel()
+        self.discovery_wakeups += 1
+        self._start_connection()
 
-            self.status_updated(status)
-            self._connection_attempts = 0
+    async def _make_connection(self):
+        device_id = self._config_entry[CONF_DEVICE_ID]
+        admission = self._hass.data[DOMAIN][DATA_ADMISSION]
+        try:
+            async with admission.slot(self._connection_priority()):
+                self.debug("Connecting to %s", self._config_entry[CONF_HOST])
+                self._interface = await pytuya.connect(
+                    self._config_entry[CONF_HOST],
+                    device_id,
+                    self._config_entry[CONF_LOCAL_KEY],
+                    float(self._config_entry[CONF_PROTOCOL_VERSION]),
+                    self,
+                    timeout=self._config_entry.get(
+                        CONF_CONNECT_TIMEOUT, DEFAULT_CONNECT_TIMEOUT
+                    ),
+                    heartbeat_interval=self._config_entry.get(
+                        CONF_HEARTBEAT_INTERVAL, DEFAULT_HEARTBEAT_INTERVAL
+                    ),
+                    stats=self.stats,
+                    recorder=self.recorder,
+                    capture=self._capture,
+                )
+                self.connect_latency.add(self._interface.connect_latency)
+                self._interface.add_dps_to_request(self._dps_to_request)
+
+                # Skip detecting device type if it is known since before
+                fingerprint = self._store.fingerprint(device_id)
+                if fingerprint:
+                    self._interface.restore_fingerprint(fingerprint)
+
+                self.debug("Retrieving initial state")
+                status = await self._interface.status()
+                if self._interface is None:
+                    # Connection was lost while waiting, disconnected() cleared it
+                    raise ConnectionResetError("Disconnected during initial status")
+                if status is None:
+                    raise Exception("Failed to retrieve status")
+
+                self._store.async_update_fingerprint(
+                    device_id, self._interface.fingerprint()
+                )
+                self.status_updated(status)
+                self._connection_attempts = 0
+
+                if self._disconnected_at is not None:
+                    self.last_recovery_time = (
+                        self._hass.loop.time() - self._disconnected_at
+                    )
+                    self._disconnected_at = None
+                    self.reconnects += 1
+                    self.debug(
+                        "Reconnected %.1f seconds after disconnect",
+                        self.last_recovery_time,
+                    )
+
+            admission.connected(device_id)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self.warning("Timed out connecting to %s", self._config_entry[CONF_HOST])
+            self.connect_timeouts += 1
+            self._connection_failed()
+        except OSError:
+            # Device could not be reached, which says nothing about its fingerprint
+            self.exception(f"Connect to {self._config_entry[CONF_HOST]} failed")
+            self._connection_failed()
         except Exception:
             self.exception(f"Connect to {self._config_entry[CONF_HOST]} failed")
-            self._connection_attempts += 1
-            if self._interface is not None:
-                self._interface.close()
-                self._interface = None
-            self._hass.loop.call_soon(self.connect)
+            # Stored fingerprint might be outdated, e.g. after a firmware update
+            self._store.async_update_fingerprint(device_id, None)
+            self._connection_failed()
         self._connect_task = None
 
+    def _connection_failed(self):
+        self.connect_failures += 1
+        self._connection_attempts += 1
+        if self._interface is not None:
+            self._interface.close()
+            self._interface = None
+        self._hass.loop.call_soon(self.connect)
+
+    @property
+    def connected(self):
+        """Return if device is connected."""
+        return self._interface is not None and self._connect_task is None
+
+    @property
+    def connected_time(self):
+        """Return seconds the current connection has been up."""
+        return self._interface.connected_time if self.connected else 0.0
+
+    def diagnostics(self, include_payloads=False):
+        """Return connection statistics and state for troubleshooting.
+
+        Decrypted payloads of recorded frames are only included if
+        include_payloads is set, as they may reveal details about the device.
+        """
+        diagnostics = {
+            "host": self._config_entry[CONF_HOST],
+            "connected": self.connected,
+            "connected_time": self.connected_time,
+            "stale": self._is_stale,
+            "connection_attempts": self._connection_attempts,
+            "reconnects": self.reconnects,
+            "connect_failures": self.connect_failures,
+            "connect_timeouts": self.connect_timeouts,
+            "connect_latency": self.connect_latency.as_dict(),
+            "last_recovery_time": self.last_recovery_time,
+            "discovery_wakeups": self.discovery_wakeups,
+            "suppressed_updates": self.suppressed_updates,
+            "traffic": self.stats.as_dict(),
+            "frames": self.recorder.dump(include_payloads),
+        }
+        if self.connected:
+            diagnostics["protocol"] = {
+                "dev_type": self._interface.dev_type,
+                "heartbeats_sent": self._interface.heartbeats_sent,
+                "heartbeats_saved": self._interface.heartbeats_saved,
+                "queue_wait": self._interface.scheduler.wait_stats(),
+            }
+        return diagnostics
+
+    @property
+    def status(self):
+        """Return current status, restored from storage until device connects."""
+        return self._status
+
+    @property
+    def is_stale(self):
+        """Return if status was restored and not yet received from the device."""
+        return self._is_stale
+
+    def _connection_priority(self):
+        """Return connection priority, devices used by automations go first."""
+        if AUTOMATION_DOMAIN not in self._hass.config.components:
+            return pytuya.PRIORITY_BACKGROUND
+
+        # Imported when used since automation is only an after dependency
+        from homeassistant.components.automation import automations_with_entity
+
+        for entity_id in self._entity_ids:
+            if automations_with_entity(self._hass, entity_id):
+                return pytuya.PRIORITY_INTERACTIVE
+        return pytuya.PRIORITY_BACKGROUND
+
+    @callback
+    def async_add_entity(self, entity_id):
+        """Register an entity of the device, returns function removing it."""
+        self._entity_ids.add(entity_id)
+
+        @callback
+        def _remove():
+            self._entity_ids.discard(entity_id)
+
+        return _remove
+
     def close(self):
         """Close connection and stop re-connect loop."""
         self._is_closing = True
+        if self._reconnect_timer:
+            self._reconnect_timer.cancel()
+            self._reconnect_timer = None
         if self._connect_task:
             self._connect_task.cancel()
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+            self._resolve_writes(self._pending_writes, None)
+            self._pending_dps, self._pending_writes = {}, []
         if self._interface:
             self._interface.close()
+        if self._capture is not None:
+            self._hass.async_create_task(self.async_stop_capture())
+
+    async def async_start_capture(self, path):
+        """Start writing raw traffic to a capture file, also after reconnecting."""
+        if self._capture is None:
+            self._capture = await self._hass.async_add_executor_job(
+                pytuya.TrafficCapture, path
+            )
+            if self._interface is not None:
+                self._interface.set_capture(self._capture)
+            self._schedule_capture_flush()
+        return self._capture.path
+
+    async def async_stop_capture(self):
+        """Stop writing raw traffic and close capture file."""
+        capture, self._capture = self._capture, None
+        if capture is None:
+            return
+        if self._capture_timer is not None:
+            self._capture_timer.cancel()
+            self._capture_timer = None
+        if self._interface is not None:
+            self._interface.set_capture(None)
+
+        # Wait for a flush in progress, so that records are written in order
+        async with self._capture_lock:
+            await self._hass.async_add_executor_job(capture.close, capture.take())
+
+    def _schedule_capture_flush(self):
+        self._capture_timer = pytuya.get_timer_scheduler().call_later(
+            CAPTURE_FLUSH_INTERVAL,
+            lambda: self._hass.async_create_task(self._async_flush_capture()),
+        )
+
+    async def _async_flush_capture(self):
+        """Write captured traffic buffered in memory to the capture file."""
+        capture = self._capture
+        if capture is None:
+            return
+
+        async with self._capture_lock:
+            try:
+                await self._hass.async_add_executor_job(capture.flush, capture.take())
+            except OSError:
+                self.exception("Failed to write capture to %s", capture.path)
+        if self._capture is capture:
+            self._schedule_capture_flush()
 
     async def set_dp(self, state, dp_index):
         """Change value of a DP of the Tuya device."""
-        if self._interface is not None:
-            try:
-                await self._interface.set_dp(state, dp_index)
-            except Exception:
-                self.exception("Failed to set DP %d to %d", dp_index, state)
-        else:
+        return await self.set_dps({dp_index: state})
+
+    async def set_dps(self, states):
+        """Change value of a DPs of the Tuya device.
+
+        Writes are sent right away when the device is idle. Writes arriving while
+        a command is in flight are merged, waiting at least the write window, and
+        sent as a single command. All callers get the response of that command.
+        """
+        if self._interface is None:
             self.error(
                 "Not connected to device %s", self._config_entry[CONF_FRIENDLY_NAME]
             )
+            return None
+
+        future = self._hass.loop.create_future()
+        self._pending_dps.update({str(dp): value for dp, value in states.items()})
+        self._pending_writes.append(future)
+        if self._flush_handle is None:
+            # Writes made in the same loop iteration are still merged when idle
+            delay = self._write_window if self._write_lock.locked() else 0
+            self._flush_handle = self._hass.loop.call_later(
+                delay,
+                lambda: self._hass.async_create_task(self._async_flush_writes()),
+            )
+        return await future
+
+    async def _async_flush_writes(self):
+        """Send all pending writes as one command."""
+        self._flush_handle = None
+        async with self._write_lock:
+            dps, futures = self._pending_dps, self._pending_writes
+            self._pending_dps, self._pending_writes = {}, []
+            if not futures:
+                return
+
+            result = None
+            if self._interface is not None:
+                if len(futures) > 1:
+                    self.debug("Merged %d writes into one: %r", len(futures), dps)
+                try:
+                    result = await self._interface.set_dps(dps)
+                except Exception:
+                    self.exception("Failed to set DPs %r", dps)
+            else:
+                self.error(
+                    "Not connected to device %s",
+                    self._config_entry[CONF_FRIENDLY_NAME],
+                )
+            self._resolve_writes(futures, result)
+
+    @staticmethod
+    def _resolve_writes(futures, result):
+        for future in futures:
+            if not future.done():
+                future.set_result(result)
 
-    async def set_dps(self, states):
-        """Change value of a DPs of the Tuya device."""
-        if self._interface is not None:
+    @callback
+    def async_subscribe(self, dps, update_callback):
+        """Subscribe to changes of a set of datapoints.
+
+        The callback is called with the full device status when any of the
+        datapoints changes and with None when the device disconnects. Returns a
+        function that removes the subscription.
+        """
+        dps = {str(dp) for dp in dps}
+        for dp in dps:
+            self._subscribers.setdefault(dp, []).append(update_callback)
+
+        @callback
+        def _unsubscribe():
+            for dp in dps:
+                subscribers = self._subscribers[dp]
+                subscribers.remove(update_callback)
+                if not subscribers:
+                    del self._subscribers[dp]
+
+        return _unsubscribe
+
+    def _notify_subscribers(self, callbacks, status):
+        for update_callback in callbacks:
             try:
-                await self._interface.set_dps(states)
+                update_callback(status)
             except Exception:
-                self.exception("Failed to set DPs %r", states)
-        else:
-            self.error(
-                "Not connected to device %s", self._config_entry[CONF_FRIENDLY_NAME]
-            )
+                self.exception("Failed to update subscriber %s", update_callback)
 
     @callback
     def status_updated(self, status):
         """Device updated status."""
+        if not status:
+            return
+
+        self._is_stale = False
         self._status.update(status)
+        self._store.async_update_status(
+            self._config_entry[CONF_DEVICE_ID], self._status
+        )
 
-        signal = f"localtuya_{self._config_entry[CONF_DEVICE_ID]}"
-        async_dispatcher_send(self._hass, signal, self._status)
+        # Only call subscribers of changed datapoints, and each of them once
+        callbacks = {}
+        for dp in status:
+            for update_callback in self._subscribers.get(str(dp), ()):
+                callbacks[update_callback] = None
+        self._notify_subscribers(callbacks, self._status)
 
     @callback
     def disconnected(self, exc):
         """Device disconnected."""
         self.debug("Disconnected: %s", exc)
+        self._disconnected_at = self._hass.loop.time()
 
-        signal = f"localtuya_{self._config_entry[CONF_DEVICE_ID]}"
-        async_dispatcher_send(self._hass, signal, None)
+        callbacks = {}
+        for subscribers in self._subscribers.values():
+            callbacks.update(dict.fromkeys(subscribers))
+        self._notify_subscribers(callbacks, None)
 
         self._interface = None
         self.connect()
@@ -223,13 +734,21 @@ class TuyaDevice(pytuya.TuyaListener, pytuya.ContextualLogger):
 class LocalTuyaEntity(Entity, pytuya.ContextualLogger):
     """Representation of a Tuya entity."""
 
-    def __init__(self, device, config_entry, dp_id, logger, **kwargs):
+    def __init__(
+        self, device, config_entry, dp_id, logger, dps_config_fields=(), **kwargs
+    ):
         """Initialize the Tuya entity."""
         self._device = device
         self._config_entry = config_entry
         self._config = get_entity_config(config_entry, dp_id)
         self._dp_id = dp_id
         self._status = {}
+        self._written = None
+        self._dps = {str(dp_id)} | {
+            str(self._config[dp_conf])
+            for dp_conf in dps_config_fields
+            if self._config.get(dp_conf) is not None
+        }
         self.set_logger(logger, self._config_entry.data[CONF_DEVICE_ID])
 
     async def async_added_to_hass(self):
@@ -242,30 +761,28 @@ class LocalTuyaEntity(Entity, pytuya.ContextualLogger):
             """Update entity state when status was updated."""
             if status is not None:
                 self._status = status
-                self.status_updated()
+                # State must still be written if availability or assumed state changed
+                written = (self.available, self.assumed_state)
+                if self.status_updated() is False and written == self._written:
+                    return
             else:
                 self._status = {}
 
+            self._written = (self.available, self.assumed_state)
             self.schedule_update_ha_state()
 
-        signal = f"localtuya_{self._config_entry.data[CONF_DEVICE_ID]}"
-        self.async_on_remove(
-            async_dispatcher_connect(self.hass, signal, _update_handler)
-        )
+        self.async_on_remove(self._device.async_subscribe(self._dps, _update_handler))
+        self.async_on_remove(self._device.async_add_entity(self.entity_id))
+
+        # Start with last known state until the device has connected
+        if self._device.is_stale and str(self._dp_id) in self._device.status:
+            self._status = self._device.status
+            self.status_updated()
 
     @property
     def device_info(self):
         """Return device information for the device registry."""
-        return {
-            "identifiers": {
-                # Serial numbers are unique identifiers within a specific domain
-                (DOMAIN, f"local_{self._config_entry.data[CONF_DEVICE_ID]}")
-            },
-            "name": self._config_entry.data[CONF_FRIENDLY_NAME],
-            "manufacturer": "Unknown",
-            "model": self._config_entry.data.get(CONF_PRODUCT_KEY, "Tuya generic"),
-            "sw_version": self._config_entry.data[CONF_PROTOCOL_VERSION],
-        }
+        return device_info(self._config_entry)
 
     @property
     def name(self):
@@ -292,6 +809,11 @@ class LocalTuyaEntity(Entity, pytuya.ContextualLogger):
         """Return if device is available or not."""
         return str(self._dp_id) in self._status
 
+    @property
+    def assumed_state(self):
+        """Return if state is restored and not yet confirmed by the device."""
+        return self._device.is_stale
+
     def dps(self, dp_index):
         """Return cached value for DPS index."""
         value = self._status.get(str(dp_index))
@@ -322,5 +844,6 @@ class LocalTuyaEntity(Entity, pytuya.ContextualLogger):
     def status_updated(self):
         """Device status was updated.
 
-        Override in subclasses and update entity specific state.
+        Override in subclasses and update entity specific state. Return False
+        to not write the state to Home Assistant, e.g. if nothing changed.
         """
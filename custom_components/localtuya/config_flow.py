@@ -1,4 +1,5 @@
 """Config flow for LocalTuya integration integration."""
+import asyncio
 import errno
 import logging
 from importlib import import_module
@@ -8,6 +9,7 @@ import voluptuous as vol
 from homeassistant import config_entries, core, exceptions
 from homeassistant.const import (
     CONF_DEVICE_ID,
+    CONF_DEVICES,
     CONF_ENTITIES,
     CONF_FRIENDLY_NAME,
     CONF_HOST,
@@ -19,10 +21,20 @@ from homeassistant.core import callback
 from . import pytuya
 from .const import CONF_DPS_STRINGS  # pylint: disable=unused-import
 from .const import (
+    CONF_CONNECTION_LIMIT,
+    CONF_CONNECT_TIMEOUT,
+    CONF_CONNECTION_RAMP,
+    CONF_HEARTBEAT_INTERVAL,
     CONF_LOCAL_KEY,
     CONF_PRODUCT_KEY,
     CONF_PROTOCOL_VERSION,
+    CONF_WRITE_WINDOW,
     DATA_DISCOVERY,
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_CONNECTION_LIMIT,
+    DEFAULT_CONNECTION_RAMP,
+    DEFAULT_HEARTBEAT_INTERVAL,
+    DEFAULT_WRITE_WINDOW,
     DOMAIN,
     PLATFORMS,
 )
@@ -52,6 +64,15 @@ OPTIONS_SCHEMA = vol.Schema(
         vol.Required(CONF_HOST): str,
         vol.Required(CONF_LOCAL_KEY): str,
         vol.Required(CONF_PROTOCOL_VERSION, default="3.3"): vol.In(["3.1", "3.3"]),
+        vol.Optional(CONF_WRITE_WINDOW, default=DEFAULT_WRITE_WINDOW): vol.All(
+            vol.Coerce(float), vol.Range(min=0.0, max=5.0)
+        ),
+        vol.Optional(
+            CONF_HEARTBEAT_INTERVAL, default=DEFAULT_HEARTBEAT_INTERVAL
+        ): vol.All(vol.Coerce(int), vol.Range(min=5, max=300)),
+        vol.Optional(CONF_CONNECT_TIMEOUT, default=DEFAULT_CONNECT_TIMEOUT): vol.All(
+            vol.Coerce(float), vol.Range(min=1.0, max=60.0)
+        ),
     }
 )
 
@@ -62,6 +83,15 @@ DEVICE_SCHEMA = vol.Schema(
         vol.Required(CONF_LOCAL_KEY): cv.string,
         vol.Required(CONF_FRIENDLY_NAME): cv.string,
         vol.Required(CONF_PROTOCOL_VERSION, default="3.3"): vol.In(["3.1", "3.3"]),
+        vol.Optional(CONF_WRITE_WINDOW, default=DEFAULT_WRITE_WINDOW): vol.All(
+            vol.Coerce(float), vol.Range(min=0.0, max=5.0)
+        ),
+        vol.Optional(
+            CONF_HEARTBEAT_INTERVAL, default=DEFAULT_HEARTBEAT_INTERVAL
+        ): vol.All(vol.Coerce(int), vol.Range(min=5, max=300)),
+        vol.Optional(CONF_CONNECT_TIMEOUT, default=DEFAULT_CONNECT_TIMEOUT): vol.All(
+            vol.Coerce(float), vol.Range(min=1.0, max=60.0)
+        ),
     }
 )
 
@@ -137,6 +167,13 @@ def strip_dps_values(user_input, dps_strings):
     return stripped
 
 
+def _devices_to_dict(value):
+    """Accept a plain list of devices as shorthand for the devices key."""
+    if isinstance(value, dict) and CONF_DEVICES in value:
+        return value
+    return {CONF_DEVICES: cv.ensure_list(value)}
+
+
 def config_schema():
     """Build schema used for setting up component."""
     entity_schemas = [
@@ -145,12 +182,20 @@ def config_schema():
     return vol.Schema(
         {
             DOMAIN: vol.All(
-                cv.ensure_list,
-                [
-                    DEVICE_SCHEMA.extend(
-                        {vol.Required(CONF_ENTITIES): [vol.Any(*entity_schemas)]}
-                    )
-                ],
+                _devices_to_dict,
+                {
+                    vol.Optional(
+                        CONF_CONNECTION_LIMIT, default=DEFAULT_CONNECTION_LIMIT
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                    vol.Optional(
+                        CONF_CONNECTION_RAMP, default=DEFAULT_CONNECTION_RAMP
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+                    vol.Required(CONF_DEVICES): [
+                        DEVICE_SCHEMA.extend(
+                            {vol.Required(CONF_ENTITIES): [vol.Any(*entity_schemas)]}
+                        )
+                    ],
+                },
             )
         },
         extra=vol.ALLOW_EXTRA,
@@ -171,7 +216,7 @@ async def validate_input(hass: core.HomeAssistant, data):
         )
 
         detected_dps = await interface.detect_available_dps()
-    except (ConnectionRefusedError, ConnectionResetError):
+    except (ConnectionRefusedError, ConnectionResetError, asyncio.TimeoutError):
         raise CannotConnect
     except ValueError:
         raise InvalidAuth
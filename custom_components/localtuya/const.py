@@ -1,13 +1,16 @@
 """Constants for localtuya integration."""
-
-ATTR_CURRENT = "current"
-ATTR_CURRENT_CONSUMPTION = "current_consumption"
-ATTR_VOLTAGE = "voltage"
+ATTR_MAX = "max"
+ATTR_MIN = "min"
 
 CONF_LOCAL_KEY = "local_key"
 CONF_PROTOCOL_VERSION = "protocol_version"
 CONF_DPS_STRINGS = "dps_strings"
 CONF_PRODUCT_KEY = "product_key"
+CONF_WRITE_WINDOW = "write_window"
+CONF_HEARTBEAT_INTERVAL = "heartbeat_interval"
+CONF_CONNECT_TIMEOUT = "connect_timeout"
+CONF_CONNECTION_LIMIT = "connection_limit"
+CONF_CONNECTION_RAMP = "connection_ramp"
 
 # light
 CONF_BRIGHTNESS_LOWER = "brightness_lower"
@@ -22,6 +25,7 @@ CONF_MUSIC_MODE = "music_mode"
 CONF_CURRENT = "current"
 CONF_CURRENT_CONSUMPTION = "current_consumption"
 CONF_VOLTAGE = "voltage"
+CONF_AVERAGE_WINDOW = "average_window"
 
 # cover
 CONF_COMMANDS_SET = "commands_set"
@@ -40,11 +44,46 @@ CONF_FAN_SPEED_HIGH = "fan_speed_high"
 
 # sensor
 CONF_SCALING = "scaling"
+CONF_DEADBAND = "deadband"
+CONF_DEADBAND_PERCENT = "deadband_percent"
+CONF_MIN_INTERVAL = "min_interval"
+CONF_MAX_INTERVAL = "max_interval"
 
+DATA_ADMISSION = "admission"
+DATA_DEVICE_ENTRIES = "device_entries"
 DATA_DISCOVERY = "discovery"
+DATA_STORE = "store"
+
+# Seconds to wait for more writes to a busy device before sending them as one command
+DEFAULT_WRITE_WINDOW = 0.05
+
+# Seconds without traffic from a device before sending a heartbeat
+DEFAULT_HEARTBEAT_INTERVAL = 20
+
+# Seconds to wait for a device to accept a connection
+DEFAULT_CONNECT_TIMEOUT = 5
+
+# Maximum number of devices connecting at the same time
+DEFAULT_CONNECTION_LIMIT = 4
+
+# Maximum number of new connections started per second
+DEFAULT_CONNECTION_RAMP = 2.0
 
 DOMAIN = "localtuya"
 
+SERVICE_DUMP_DIAGNOSTICS = "dump_diagnostics"
+
+ATTR_INCLUDE_PAYLOADS = "include_payloads"
+
+SERVICE_START_CAPTURE = "start_capture"
+SERVICE_STOP_CAPTURE = "stop_capture"
+
+# File in the configuration directory written by the dump_diagnostics service
+DIAGNOSTICS_FILE = "localtuya_diagnostics.json"
+
+# File in the configuration directory written by the start_capture service
+CAPTURE_FILE = "localtuya_capture_{}.bin"
+
 # Platforms in this list must support config flows
 PLATFORMS = ["binary_sensor", "cover", "fan", "light", "sensor", "switch"]
 
@@ -5,12 +5,12 @@ Entirely based on tuya-convert.py from tuya-convert:
 https://github.com/ct-Open-Source/tuya-convert/blob/master/scripts/tuya-discovery.py
 """
 import asyncio
-import json
 import logging
+import time
+from collections import OrderedDict
 from hashlib import md5
 
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from .pytuya import JSON_CODEC, get_cipher
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -18,16 +18,16 @@ UDP_KEY = md5(b"yGAdlopoPVldABfn").digest()
 
 DEFAULT_TIMEOUT = 6.0
 
+# Seconds to reuse the decoded content of a broadcast received before
+CACHE_TTL = 300
 
-def decrypt_udp(message):
-    """Decrypt encrypted UDP broadcasts."""
+# Maximum number of distinct broadcasts to keep decoded content of
+CACHE_SIZE = 1024
 
-    def _unpad(data):
-        return data[: -ord(data[len(data) - 1 :])]
 
-    cipher = Cipher(algorithms.AES(UDP_KEY), modes.ECB(), default_backend())
-    decryptor = cipher.decryptor()
-    return _unpad(decryptor.update(message) + decryptor.finalize()).decode()
+def decrypt_udp(message):
+    """Decrypt encrypted UDP broadcasts."""
+    return get_cipher(UDP_KEY).decrypt(message, False)
 
 
 class TuyaDiscovery(asyncio.DatagramProtocol):
@@ -36,8 +36,10 @@ class TuyaDiscovery(asyncio.DatagramProtocol):
     def __init__(self, callback=None):
         """Initialize a new BaseDiscovery."""
         self.devices = {}
+        self.cache_hits = 0
         self._listeners = []
         self._callback = callback
+        self._cache = OrderedDict()
 
     async def start(self):
         """Start discovery by listening to broadcasts."""
@@ -60,13 +62,34 @@ class TuyaDiscovery(asyncio.DatagramProtocol):
 
     def datagram_received(self, data, addr):
         """Handle received broadcast message."""
-        data = data[20:-8]
+        # Devices repeat the same broadcast every few seconds, so decoded content
+        # is cached by the raw datagram
+        now = time.monotonic()
+        cached = self._cache.get(data)
+        if cached is not None and cached[0] > now:
+            self._cache.move_to_end(data)
+            self.cache_hits += 1
+            self.device_found(cached[1])
+            return
+
+        payload = data[20:-8]
+
+        # Broadcasts on port 6666 are plain JSON, the ones on 6667 are encrypted
         try:
-            data = decrypt_udp(data)
-        except Exception:
-            data = data.decode()
-
-        decoded = json.loads(data)
+            if not payload.startswith(b"{"):
+                payload = decrypt_udp(payload)
+            decoded = JSON_CODEC.loads(payload)
+        except ValueError as ex:
+            _LOGGER.debug("Ignoring invalid broadcast from %s: %s", addr, ex)
+            return
+        if not isinstance(decoded, dict):
+            _LOGGER.debug("Ignoring unexpected broadcast from %s: %s", addr, decoded)
+            return
+
+        self._cache[data] = (now + CACHE_TTL, decoded)
+        self._cache.move_to_end(data)
+        if len(self._cache) > CACHE_SIZE:
+            self._cache.popitem(last=False)
         self.device_found(decoded)
 
     def device_found(self, device):
@@ -1,4 +1,5 @@
 """Platform to locally control Tuya-based fan devices."""
+import asyncio
 import logging
 from functools import partial
 
@@ -81,10 +82,13 @@ class LocaltuyaFan(LocalTuyaEntity, FanEntity):
 
     async def async_turn_on(self, speed: str = None, **kwargs) -> None:
         """Turn on the entity."""
-        await self._device.set_dp(True, self._dp_id)
         if speed is not None:
-            await self.async_set_speed(speed)
+            # Issue both writes at once so they are merged into a single command
+            await asyncio.gather(
+                self._device.set_dp(True, self._dp_id), self.async_set_speed(speed)
+            )
         else:
+            await self._device.set_dp(True, self._dp_id)
             self.schedule_update_ha_state()
 
     async def async_turn_off(self, **kwargs) -> None:
@@ -21,6 +21,8 @@ Functions
    json = status()          # returns json payload
    set_version(version)     #  3.1 [default] or 3.3
    detect_available_dps()   # returns a list of available dps provided by the device
+   fingerprint() / restore_fingerprint(fingerprint)  # save/restore device type
+   read_capture(path)       # yields records from a raw traffic capture file
    add_dps_to_request(dp_index)  # adds dp_index to the list of dps used by the
                                   # device (to be queried in the payload)
    set_dp(on, dp_index)   # Set value of any dps index.
@@ -38,18 +40,31 @@ Credits
 import asyncio
 import base64
 import binascii
+import bisect
+import contextlib
+import functools
+import heapq
+import itertools
 import json
 import logging
+import math
+import random
+import socket
 import struct
 import time
 import weakref
 from abc import ABC, abstractmethod
-from collections import namedtuple
+from collections import deque, namedtuple
 from hashlib import md5
 
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 version_tuple = (9, 0, 0)
 version = version_string = __version__ = "%d.%d.%d" % version_tuple
 __author__ = "postlund"
@@ -57,6 +72,8 @@ __author__ = "postlund"
 _LOGGER = logging.getLogger(__name__)
 
 TuyaMessage = namedtuple("TuyaMessage", "seqno cmd retcode payload crc")
+JsonCodec = namedtuple("JsonCodec", "name loads dumps")
+PendingRequest = namedtuple("PendingRequest", "cmd future")
 
 SET = "set"
 STATUS = "status"
@@ -71,11 +88,85 @@ MESSAGE_HEADER_FMT = ">4I"  # 4*uint32: prefix, seqno, cmd, length
 MESSAGE_RECV_HEADER_FMT = ">5I"  # 4*uint32: prefix, seqno, cmd, length, retcode
 MESSAGE_END_FMT = ">2I"  # 2*uint32: crc, suffix
 
+MESSAGE_HEADER = struct.Struct(MESSAGE_HEADER_FMT)
+MESSAGE_RECV_HEADER = struct.Struct(MESSAGE_RECV_HEADER_FMT)
+MESSAGE_END = struct.Struct(MESSAGE_END_FMT)
+
 PREFIX_VALUE = 0x000055AA
 SUFFIX_VALUE = 0x0000AA55
+PREFIX_BYTES = struct.pack(">I", PREFIX_VALUE)
 
 HEARTBEAT_INTERVAL = 20
 
+# Seconds to wait for a connection to be established
+CONNECT_TIMEOUT = 5
+
+# TCP keepalive probing of idle connections, so that half-open connections are
+# detected within KEEPALIVE_IDLE + KEEPALIVE_INTERVAL * KEEPALIVE_COUNT seconds
+KEEPALIVE_IDLE = 10
+KEEPALIVE_INTERVAL = 5
+KEEPALIVE_COUNT = 2
+
+# Seconds that sent data may remain unacknowledged before the connection is closed
+USER_TIMEOUT = 10
+
+# Fraction of the heartbeat interval added as random jitter to each heartbeat
+HEARTBEAT_JITTER = 0.1
+
+# Granularity in seconds of deadlines in TimerScheduler
+TIMER_RESOLUTION = 0.25
+
+# Priorities of exchanges with a device, lower value is more important
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_BACKGROUND: "background",
+}
+
+# Maximum number of exchanges in progress with a device at the same time
+MAX_INFLIGHT = 2
+
+# Maximum number of local keys to keep initialized ciphers for
+CIPHER_CACHE_SIZE = 1024
+
+# Upper bounds in seconds of the buckets in round trip time histograms
+RTT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Number of most recent frames kept by the flight recorder of each device
+FLIGHT_RECORDER_SIZE = 200
+
+FRAME_IN = "in"
+FRAME_OUT = "out"
+
+# Raw traffic capture files start with this magic, followed by records of a
+# header (timestamp, direction, length) and the data written or received
+CAPTURE_MAGIC = b"TUYACAP1"
+CAPTURE_RECORD = struct.Struct("<dBI")  # double: timestamp, uint8, uint32
+CAPTURE_IN = 0
+CAPTURE_OUT = 1
+# Records without data marking that the connection was established (or that the
+# capture started while connected) and that it was lost
+CAPTURE_CONNECT = 2
+CAPTURE_DISCONNECT = 3
+
+# Devices reject requests with a (plain text) payload longer than this
+MAX_PAYLOAD_SIZE = 255
+
+# Maximum number of datapoints probed next to a detected datapoint at a time
+DP_PROBE_STEP = 10
+
+# Datapoints always probed by detect_available_dps (1 is always included): the
+# ranges used by most devices, 1-30 and 100-110, and DP_PROBE_STEP past 30 as
+# long as that still fits in four requests
+DP_SEED = (*range(2, 31 + DP_PROBE_STEP), *range(100, 111))
+
+JSON_SEPARATORS = (",", ":")
+
+# PKCS#7 padding for each possible number of padding bytes
+PADDING_BLOCKS = [bytes([padnum]) * padnum for padnum in range(17)]
+
 # This is intended to match requests.json payload at
 # https://github.com/codetheweb/tuyapi :
 # type_0a devices require the 0a command as the status request
@@ -85,6 +176,8 @@ HEARTBEAT_INTERVAL = 20
 # prefix: # Next byte is command byte ("hexByte") some zero padding, then length
 # of remaining payload, i.e. command + suffix (unclear if multiple bytes used for
 # length, zero padding implies could be more than one byte)
+# This dict only describes the commands, per device templates are compiled from it
+# by compile_templates and it must not be modified.
 PAYLOAD_DICT = {
     "type_0a": {
         STATUS: {"hexByte": 0x0A, "command": {"gwId": "", "devId": ""}},
@@ -99,6 +192,68 @@ PAYLOAD_DICT = {
 }
 
 
+def _json_loads(data):
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+def _json_dumps(obj):
+    return json.dumps(obj, separators=JSON_SEPARATORS).encode()
+
+
+# Codecs used to decode payloads from bytes and encode them into bytes. The
+# fastest available one is used by default.
+JSON_CODECS = {"json": JsonCodec("json", _json_loads, _json_dumps)}
+if orjson is not None:
+    JSON_CODECS["orjson"] = JsonCodec(
+        "orjson",
+        orjson.loads,
+        functools.partial(orjson.dumps, option=orjson.OPT_NON_STR_KEYS),
+    )
+JSON_CODEC = JSON_CODECS.get("orjson", JSON_CODECS["json"])
+
+
+class CommandTemplate:
+    """JSON command for a device with static fields serialized in advance."""
+
+    __slots__ = ("hexbyte", "_prefix", "_timestamp")
+
+    def __init__(self, hexbyte, fields, dev_id):
+        """Initialize a new CommandTemplate."""
+        self.hexbyte = hexbyte
+
+        # All id fields carry the device id (there is no separate uid), the
+        # timestamp is always the last field and is added per command
+        static = {field: dev_id for field in fields if field != "t"}
+        self._prefix = json.dumps(static, separators=JSON_SEPARATORS)[:-1].encode()
+        self._timestamp = "t" in fields
+
+    def render(self, dps=None):
+        """Return serialized command with current timestamp and dps."""
+        payload = self._prefix
+        separator = b"," if len(payload) > 1 else b""
+        if self._timestamp:
+            payload += b'%s"t":"%d"' % (separator, time.time())
+            separator = b","
+        if dps is not None:
+            payload += separator + b'"dps":' + JSON_CODEC.dumps(dps)
+        return payload + b"}"
+
+
+def compile_templates(dev_id):
+    """Compile command templates in PAYLOAD_DICT for a device."""
+    return {
+        dev_type: {
+            command: CommandTemplate(
+                cmd_data["hexByte"], cmd_data["command"].keys(), dev_id
+            )
+            for command, cmd_data in commands.items()
+        }
+        for dev_type, commands in PAYLOAD_DICT.items()
+    }
+
+
 class TuyaLoggingAdapter(logging.LoggerAdapter):
     """Adapter that adds device id to all log points."""
 
@@ -144,32 +299,26 @@ def pack_message(msg):
     """Pack a TuyaMessage into bytes."""
     # Create full message excluding CRC and suffix
     buffer = (
-        struct.pack(
-            MESSAGE_HEADER_FMT,
+        MESSAGE_HEADER.pack(
             PREFIX_VALUE,
             msg.seqno,
             msg.cmd,
-            len(msg.payload) + struct.calcsize(MESSAGE_END_FMT),
+            len(msg.payload) + MESSAGE_END.size,
         )
         + msg.payload
     )
 
     # Calculate CRC, add it together with suffix
-    buffer += struct.pack(MESSAGE_END_FMT, binascii.crc32(buffer), SUFFIX_VALUE)
+    buffer += MESSAGE_END.pack(binascii.crc32(buffer), SUFFIX_VALUE)
 
     return buffer
 
 
 def unpack_message(data):
     """Unpack bytes into a TuyaMessage."""
-    header_len = struct.calcsize(MESSAGE_RECV_HEADER_FMT)
-    end_len = struct.calcsize(MESSAGE_END_FMT)
-
-    _, seqno, cmd, _, retcode = struct.unpack(
-        MESSAGE_RECV_HEADER_FMT, data[:header_len]
-    )
-    payload = data[header_len:-end_len]
-    crc, _ = struct.unpack(MESSAGE_END_FMT, data[-end_len:])
+    _, seqno, cmd, _, retcode = MESSAGE_RECV_HEADER.unpack_from(data)
+    payload = data[MESSAGE_RECV_HEADER.size : -MESSAGE_END.size]
+    crc, _ = MESSAGE_END.unpack_from(data, len(data) - MESSAGE_END.size)
     return TuyaMessage(seqno, cmd, retcode, payload, crc)
 
 
@@ -181,116 +330,186 @@ class AESCipher:
         self.bs = 16
         self.cipher = Cipher(algorithms.AES(key), modes.ECB(), default_backend())
 
+        # ECB carries no state between blocks, so a single context per direction
+        # can be kept and reused as long as only whole blocks are fed to it
+        self._encryptor = self.cipher.encryptor()
+        self._decryptor = self.cipher.decryptor()
+
     def encrypt(self, raw, use_base64=True):
         """Encrypt data to be sent to device."""
-        encryptor = self.cipher.encryptor()
-        crypted_text = encryptor.update(self._pad(raw)) + encryptor.finalize()
+        crypted_text = self._encryptor.update(self._pad(raw))
         return base64.b64encode(crypted_text) if use_base64 else crypted_text
 
     def decrypt(self, enc, use_base64=True):
-        """Decrypt data from device."""
+        """Decrypt data from device and return it as bytes."""
         if use_base64:
             enc = base64.b64decode(enc)
 
-        decryptor = self.cipher.decryptor()
-        return self._unpad(decryptor.update(enc) + decryptor.finalize()).decode()
+        if len(enc) % self.bs != 0:
+            raise ValueError(f"invalid length of encrypted data: {len(enc)}")
+        return self._unpad(self._decryptor.update(enc))
 
     def _pad(self, s):
-        padnum = self.bs - len(s) % self.bs
-        return s + padnum * chr(padnum).encode()
+        # A single concatenation copies the payload once. Filling a preallocated
+        # bytearray instead was measured 20-70% slower for payloads up to
+        # MAX_PAYLOAD_SIZE, as the extra slicing costs more than it saves.
+        return s + PADDING_BLOCKS[self.bs - len(s) % self.bs]
 
     @staticmethod
     def _unpad(s):
-        return s[: -ord(s[len(s) - 1 :])]
+        return s[: -s[-1]] if s else s
+
+
+@functools.lru_cache(maxsize=CIPHER_CACHE_SIZE)
+def get_cipher(key):
+    """Return a cipher for a key, shared by all connections using the same key."""
+    return AESCipher(key)
 
 
 class MessageDispatcher(ContextualLogger):
     """Buffer and dispatcher for Tuya messages."""
 
-    # Heartbeats always respond with sequence number 0, so they can't be waited for like
-    # other messages. This is a hack to allow waiting for heartbeats.
-    HEARTBEAT_SEQNO = -100
+    # Number of consumed bytes allowed in front of the buffer before compacting it
+    COMPACT_THRESHOLD = 4096
 
-    def __init__(self, dev_id, listener):
+    def __init__(self, dev_id, listener, stats=None, recorder=None):
         """Initialize a new MessageBuffer."""
-        self.buffer = b""
+        self.buffer = bytearray()
+        self.pos = 0
         self.listeners = {}
         self.listener = listener
+        self.stats = stats or ConnectionStats()
+        self.recorder = recorder or FlightRecorder()
         self.set_logger(_LOGGER, dev_id)
 
     def abort(self):
         """Abort all waiting clients."""
-        for key in self.listeners:
-            sem = self.listeners[key]
-            self.listeners[key] = None
+        listeners, self.listeners = self.listeners, {}
+        for request in listeners.values():
+            if not request.future.done():
+                request.future.set_result(None)
 
-            # TODO: Received data and semahore should be stored separately
-            if isinstance(sem, asyncio.Semaphore):
-                sem.release()
+    async def wait_for(self, seqno, cmd, timeout=5):
+        """Wait for response to a request to be received and return it.
 
-    async def wait_for(self, seqno, timeout=5):
-        """Wait for response to a sequence number to be received and return it."""
+        Any number of requests can be waited for at the same time, each with its
+        own deadline.
+        """
         if seqno in self.listeners:
             raise Exception(f"listener exists for {seqno}")
 
         self.debug("Waiting for sequence number %d", seqno)
-        self.listeners[seqno] = asyncio.Semaphore(0)
+        loop = asyncio.get_running_loop()
+        request = PendingRequest(cmd, loop.create_future())
+        deadline = loop.call_later(timeout, self._expire, request)
+        self.listeners[seqno] = request
         try:
-            await asyncio.wait_for(self.listeners[seqno].acquire(), timeout=timeout)
-        except asyncio.TimeoutError:
-            del self.listeners[seqno]
-            raise
+            return await request.future
+        finally:
+            deadline.cancel()
+            if self.listeners.get(seqno) is request:
+                del self.listeners[seqno]
+
+    @staticmethod
+    def _expire(request):
+        if not request.future.done():
+            request.future.set_exception(asyncio.TimeoutError())
 
-        return self.listeners.pop(seqno)
+    def _resolve(self, seqno, msg):
+        request = self.listeners.pop(seqno)
+        if not request.future.done():
+            request.future.set_result(msg)
 
     def add_data(self, data):
         """Add new data to the buffer and try to parse messages."""
-        self.buffer += data
-        header_len = struct.calcsize(MESSAGE_RECV_HEADER_FMT)
-
-        while self.buffer:
-            # Check if enough data for measage header
-            if len(self.buffer) < header_len:
-                break
-
-            # Parse header and check if enough data according to length in header
-            _, seqno, cmd, length, retcode = struct.unpack_from(
-                MESSAGE_RECV_HEADER_FMT, self.buffer
-            )
-            if len(self.buffer[header_len - 4 :]) < length:
-                break
+        buffer = self.buffer
+        buffer += data
+        stats = self.stats
+        stats.bytes_in += len(data)
+        header_len = MESSAGE_RECV_HEADER.size
+        end_len = MESSAGE_END.size
+
+        # Messages are parsed in place by moving a read cursor forward instead of
+        # slicing off each message, which would copy the rest of the buffer
+        view = memoryview(buffer)
+        try:
+            while len(buffer) - self.pos >= header_len:
+                pos = self.pos
 
-            # length includes payload length, retcode, crc and suffix
-            if (retcode & 0xFFFFFF00) != 0:
-                payload_start = header_len - 4
-                payload_length = length - struct.calcsize(MESSAGE_END_FMT)
-            else:
-                payload_start = header_len
-                payload_length = length - 4 - struct.calcsize(MESSAGE_END_FMT)
-            payload = self.buffer[payload_start : payload_start + payload_length]
+                # Parse header and check if enough data according to length in header
+                prefix, seqno, cmd, length, retcode = MESSAGE_RECV_HEADER.unpack_from(
+                    buffer, pos
+                )
+                if prefix != PREFIX_VALUE:
+                    self._skip_to_prefix(buffer, pos)
+                    continue
 
-            crc, _ = struct.unpack_from(
-                MESSAGE_END_FMT,
-                self.buffer[payload_start + payload_length : payload_start + length],
-            )
+                message_end = pos + header_len - 4 + length
+                if message_end > len(buffer):
+                    break
 
-            self.buffer = self.buffer[header_len - 4 + length :]
-            self._dispatch(TuyaMessage(seqno, cmd, retcode, payload, crc))
+                # length includes payload length, retcode, crc and suffix
+                if (retcode & 0xFFFFFF00) != 0:
+                    payload_start = pos + header_len - 4
+                    payload_length = length - end_len
+                else:
+                    payload_start = pos + header_len
+                    payload_length = length - 4 - end_len
+                payload_end = payload_start + payload_length
+                payload = bytes(view[payload_start:payload_end])
+
+                crc, _ = MESSAGE_END.unpack_from(buffer, payload_end)
+
+                self.pos = message_end
+                stats.frames_in += 1
+                if crc != binascii.crc32(view[pos:payload_end]):
+                    stats.decode_errors += 1
+                    self.warning("Dropped frame with bad CRC (seqno %d)", seqno)
+                    continue
+
+                self.recorder.record(
+                    FRAME_IN, cmd, seqno, message_end - pos, retcode, payload
+                )
+                self._dispatch(TuyaMessage(seqno, cmd, retcode, payload, crc))
+        finally:
+            view.release()
+
+        # Drop consumed data once everything has been parsed or when enough has
+        # accumulated in front of a partial message
+        if self.pos == len(buffer):
+            buffer.clear()
+            self.pos = 0
+        elif self.pos >= self.COMPACT_THRESHOLD:
+            del buffer[: self.pos]
+            self.pos = 0
+
+    def _skip_to_prefix(self, buffer, pos):
+        """Skip data up to the next frame prefix, e.g. after a corrupt frame."""
+        next_pos = buffer.find(PREFIX_BYTES, pos + 1)
+        if next_pos == -1:
+            # Keep what could be the beginning of a prefix
+            next_pos = max(pos + 1, len(buffer) - len(PREFIX_BYTES) + 1)
+        self.stats.decode_errors += 1
+        self.warning("Skipped %d bytes without frame prefix", next_pos - pos)
+        self.pos = next_pos
 
     def _dispatch(self, msg):
         """Dispatch a message to someone that is listening."""
         self.debug("Dispatching message %s", msg)
-        if msg.seqno in self.listeners:
+        # Heartbeat responses may carry sequence number 0 instead of the one in
+        # the request, so they are only matched against heartbeat requests and
+        # fall back to the oldest one
+        is_heartbeat = msg.cmd == 0x09
+        request = self.listeners.get(msg.seqno)
+        if request is not None and (request.cmd == 0x09) == is_heartbeat:
             self.debug("Dispatching sequence number %d", msg.seqno)
-            sem = self.listeners[msg.seqno]
-            self.listeners[msg.seqno] = msg
-            sem.release()
-        elif msg.cmd == 0x09:
+            self._resolve(msg.seqno, msg)
+        elif is_heartbeat:
             self.debug("Got heartbeat response")
-            if self.HEARTBEAT_SEQNO in self.listeners:
-                sem = self.listeners[self.HEARTBEAT_SEQNO]
-                self.listeners[self.HEARTBEAT_SEQNO] = msg
-                sem.release()
+            for seqno, request in self.listeners.items():
+                if request.cmd == 0x09:
+                    self._resolve(seqno, msg)
+                    break
         elif msg.cmd == 0x08:
             self.debug("Got status update")
             self.listener(msg)
@@ -303,12 +522,400 @@ class MessageDispatcher(ContextualLogger):
             )
 
 
+class QueueStats:
+    """Statistics of time spent waiting, e.g. in a queue or for a connection."""
+
+    def __init__(self):
+        """Initialize a new QueueStats."""
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, wait):
+        """Add time spent waiting by one item."""
+        self.count += 1
+        self.total += wait
+        self.max = max(self.max, wait)
+
+    def as_dict(self):
+        """Return statistics as a dict."""
+        return {
+            "count": self.count,
+            "average": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+        }
+
+
+class FlightRecorder:
+    """Ring buffer with the most recent frames sent to and received from a device.
+
+    Recording a frame only appends a tuple, payloads are kept as they are and
+    received ones are decrypted when dumped.
+    """
+
+    def __init__(self, size=FLIGHT_RECORDER_SIZE):
+        """Initialize a new FlightRecorder."""
+        self.frames = deque(maxlen=size)
+        self.decrypt = None
+
+    def record(self, direction, cmd, seqno, length, retcode, payload):
+        """Record a frame."""
+        self.frames.append(
+            (time.time(), direction, cmd, seqno, length, retcode, payload)
+        )
+
+    def dump(self, include_payloads=False):
+        """Return recorded frames, oldest first, as a list of dicts."""
+        frames = []
+        for timestamp, direction, cmd, seqno, length, retcode, payload in self.frames:
+            frame = {
+                "time": timestamp,
+                "direction": direction,
+                "cmd": cmd,
+                "seqno": seqno,
+                "length": length,
+                "retcode": retcode,
+            }
+            if include_payloads:
+                frame["payload"] = self._payload_text(direction, payload)
+            frames.append(frame)
+        return frames
+
+    def _payload_text(self, direction, payload):
+        if direction == FRAME_IN and self.decrypt is not None:
+            try:
+                payload = self.decrypt(payload)
+            except Exception as ex:
+                return f"<failed to decrypt: {ex}>"
+        return payload.decode("utf-8", errors="replace")
+
+
+class TrafficCapture:
+    """Append-only file with raw data received from and written to a device.
+
+    Data is recorded exactly as passed to data_received and transport.write, so
+    that replaying a capture reproduces TCP fragmentation as seen in the wild.
+    Records are buffered in memory by write, which is called from the event loop.
+    Buffered records are handed out by take and written to the file by flush and
+    close, which block and are meant to run in an executor.
+    """
+
+    def __init__(self, path):
+        """Initialize a new TrafficCapture, appending to path if it exists."""
+        self.path = path
+        self.buffer = bytearray()
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(CAPTURE_MAGIC)
+            self.file.flush()
+
+    def write(self, direction, data=b""):
+        """Buffer data sent in direction (CAPTURE_IN or CAPTURE_OUT) or an event."""
+        self.buffer += CAPTURE_RECORD.pack(time.time(), direction, len(data))
+        self.buffer += data
+
+    def take(self):
+        """Return buffered records and start a new buffer."""
+        data, self.buffer = self.buffer, bytearray()
+        return data
+
+    def flush(self, data):
+        """Write records returned by take to the file."""
+        self.file.write(data)
+        self.file.flush()
+
+    def close(self, data=b""):
+        """Write remaining records returned by take and close capture file."""
+        self.file.write(data)
+        self.file.close()
+
+
+def read_capture(path):
+    """Yield (timestamp, direction, data) for each record in a capture file."""
+    with open(path, "rb") as fh:
+        if fh.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+        while True:
+            header = fh.read(CAPTURE_RECORD.size)
+            if len(header) < CAPTURE_RECORD.size:
+                # A truncated record at the end is expected if the capture was
+                # still being written to
+                return
+            timestamp, direction, length = CAPTURE_RECORD.unpack(header)
+            data = fh.read(length)
+            if len(data) < length:
+                return
+            yield timestamp, direction, data
+
+
+class Histogram:
+    """Histogram with fixed buckets, cheap to update and small to keep."""
+
+    __slots__ = ("bounds", "counts", "count", "total", "max")
+
+    def __init__(self, bounds=RTT_BUCKETS):
+        """Initialize a new Histogram."""
+        self.bounds = bounds
+        # Last bucket counts values above the largest bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        """Add a value."""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, percent):
+        """Return upper bound of bucket with the given percentile, None if empty.
+
+        The maximum value is returned for values in the last bucket.
+        """
+        if not self.count:
+            return None
+
+        rank = math.ceil(self.count * percent / 100)
+        for bound, count in zip(self.bounds, self.counts):
+            rank -= count
+            if rank <= 0:
+                return bound
+        return self.max
+
+    def as_dict(self):
+        """Return histogram as a dict."""
+        buckets = {str(bound): count for bound, count in zip(self.bounds, self.counts)}
+        buckets["inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "average": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "buckets": buckets,
+        }
+
+
+class ConnectionStats:
+    """Traffic counters and round trip times of connections to a device."""
+
+    def __init__(self):
+        """Initialize a new ConnectionStats."""
+        self.frames_in = 0
+        self.bytes_in = 0
+        self.frames_out = 0
+        self.bytes_out = 0
+        self.decode_errors = 0
+        self.timeouts = 0
+        self.rtt = Histogram()
+        self.command_rtt = {}
+
+    def add_rtt(self, command, rtt):
+        """Add round trip time of an exchange."""
+        self.rtt.add(rtt)
+        histogram = self.command_rtt.get(command)
+        if histogram is None:
+            histogram = self.command_rtt[command] = Histogram()
+        histogram.add(rtt)
+
+    def as_dict(self):
+        """Return statistics as a dict."""
+        return {
+            "frames_in": self.frames_in,
+            "bytes_in": self.bytes_in,
+            "frames_out": self.frames_out,
+            "bytes_out": self.bytes_out,
+            "decode_errors": self.decode_errors,
+            "timeouts": self.timeouts,
+            "rtt": {
+                command: histogram.as_dict()
+                for command, histogram in self.command_rtt.items()
+            },
+        }
+
+
+class CommandScheduler:
+    """Scheduler ordering the exchanges on a connection by priority.
+
+    Interactive exchanges are admitted as long as less than max_inflight
+    exchanges are in progress. Background exchanges are deferred until the
+    device is idle and no interactive exchange is waiting.
+    """
+
+    def __init__(self, max_inflight=MAX_INFLIGHT):
+        """Initialize a new CommandScheduler."""
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.stats = {priority: QueueStats() for priority in PRIORITY_NAMES}
+        self._waiting = []
+        self._order = itertools.count()
+
+    def _admissible(self, priority):
+        if self.inflight >= self.max_inflight:
+            return False
+        return priority == PRIORITY_INTERACTIVE or self.inflight == 0
+
+    def _wakeup(self):
+        """Admit waiting exchanges in priority order."""
+        while self._waiting:
+            priority, _, future = self._waiting[0]
+            if future.done():
+                heapq.heappop(self._waiting)
+            elif self._admissible(priority):
+                heapq.heappop(self._waiting)
+                self.inflight += 1
+                future.set_result(None)
+            else:
+                break
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority):
+        """Wait until an exchange with a priority may be performed."""
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        if self._admissible(priority) and (
+            not self._waiting or self._waiting[0][0] > priority
+        ):
+            self.inflight += 1
+        else:
+            future = loop.create_future()
+            heapq.heappush(self._waiting, (priority, next(self._order), future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                # Give the slot back if cancelled right after being admitted
+                if future.done() and not future.cancelled():
+                    self.inflight -= 1
+                    self._wakeup()
+                raise
+
+        self.stats[priority].add(loop.time() - start)
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            self._wakeup()
+
+    def wait_stats(self):
+        """Return queue wait time statistics per priority class."""
+        return {
+            name: self.stats[priority].as_dict()
+            for priority, name in PRIORITY_NAMES.items()
+        }
+
+
+class TimerEntry:
+    """Timer scheduled in a TimerScheduler."""
+
+    __slots__ = ("deadline", "callback", "args", "cancelled")
+
+    def __init__(self, deadline, callback, args):
+        """Initialize a new TimerEntry."""
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """Cancel the timer."""
+        self.cancelled = True
+
+
+class TimerScheduler:
+    """Scheduler running timers for all connections from a single task.
+
+    Deadlines are kept in a heap and rounded up to multiples of resolution, so
+    timers due close to each other run in the same wakeup. The task only runs
+    while there are timers scheduled.
+    """
+
+    def __init__(self, resolution=TIMER_RESOLUTION):
+        """Initialize a new TimerScheduler."""
+        self.resolution = resolution
+        self.wakeups = 0
+        self.fired = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self._heap = []
+        self._order = itertools.count()
+        self._task = None
+        self._wakeup = None
+
+    def call_later(self, delay, callback, *args, jitter=0.0):
+        """Call a callback after delay seconds, plus random jitter if given."""
+        loop = asyncio.get_running_loop()
+        if jitter > 0:
+            delay += random.uniform(0, jitter)
+        deadline = math.ceil((loop.time() + delay) / self.resolution) * self.resolution
+        entry = TimerEntry(deadline, callback, args)
+        heapq.heappush(self._heap, (deadline, next(self._order), entry))
+
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+        elif self._heap[0][2] is entry and self._wakeup and not self._wakeup.done():
+            # New timer is due before the one the task is currently waiting for
+            self._wakeup.set_result(None)
+        return entry
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._heap:
+            deadline = self._heap[0][0]
+            delay = deadline - loop.time()
+            if delay > 0:
+                self._wakeup = loop.create_future()
+                await asyncio.wait([self._wakeup], timeout=delay)
+                continue
+
+            self.wakeups += 1
+            now = loop.time()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, entry = heapq.heappop(self._heap)
+                if entry.cancelled:
+                    continue
+
+                self.fired += 1
+                self.last_lag = now - entry.deadline
+                self.max_lag = max(self.max_lag, self.last_lag)
+                self.total_lag += self.last_lag
+                try:
+                    entry.callback(*entry.args)
+                except Exception:
+                    _LOGGER.exception("Timer callback %s failed", entry.callback)
+
+    def lag_stats(self):
+        """Return statistics of how late timers run compared to their deadline."""
+        return {
+            "pending": len(self._heap),
+            "wakeups": self.wakeups,
+            "fired": self.fired,
+            "last_lag": self.last_lag,
+            "average_lag": self.total_lag / self.fired if self.fired else 0.0,
+            "max_lag": self.max_lag,
+        }
+
+
+_timer_schedulers = weakref.WeakKeyDictionary()
+
+
+def get_timer_scheduler():
+    """Return timer scheduler shared by all connections on the running loop."""
+    loop = asyncio.get_running_loop()
+    if loop not in _timer_schedulers:
+        _timer_schedulers[loop] = TimerScheduler()
+    return _timer_schedulers[loop]
+
+
 class TuyaListener(ABC):
     """Listener interface for Tuya device changes."""
 
     @abstractmethod
     def status_updated(self, status):
-        """Device updated status."""
+        """Device updated status.
+
+        Only datapoints that changed since the previous update are included.
+        """
 
     @abstractmethod
     def disconnected(self, exc):
@@ -325,10 +932,42 @@ class EmptyListener(TuyaListener):
         """Device disconnected."""
 
 
+def _dps_next_to(found, probed):
+    """Return datapoints not probed yet next to found ones, nearest first.
+
+    Datapoints up to DP_PROBE_STEP away are included, but not past DP_SEED as it
+    is always probed in full.
+    """
+    distances = {}
+    for dp in found:
+        for direction in (-1, 1):
+            for distance in range(1, DP_PROBE_STEP + 1):
+                neighbour = dp + direction * distance
+                if neighbour in DP_SEED or not 2 <= neighbour <= 255:
+                    break
+                if neighbour not in probed:
+                    distances[neighbour] = min(
+                        distances.get(neighbour, distance), distance
+                    )
+    return sorted(distances, key=lambda dp: (distances[dp], dp))
+
+
 class TuyaProtocol(asyncio.Protocol, ContextualLogger):
     """Implementation of the Tuya protocol."""
 
-    def __init__(self, dev_id, local_key, protocol_version, on_connected, listener):
+    def __init__(
+        self,
+        dev_id,
+        local_key,
+        protocol_version,
+        on_connected,
+        listener,
+        heartbeat_interval=HEARTBEAT_INTERVAL,
+        timers=None,
+        stats=None,
+        recorder=None,
+        capture=None,
+    ):
         """
         Initialize a new TuyaInterface.
 
@@ -336,6 +975,14 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
             dev_id (str): The device id.
             address (str): The network address.
             local_key (str, optional): The encryption key. Defaults to None.
+            heartbeat_interval (int, optional): Seconds without receiving anything
+                from the device before sending a heartbeat.
+            timers (TimerScheduler, optional): Scheduler to run heartbeats with.
+                Defaults to the shared scheduler of the event loop.
+            stats (ConnectionStats, optional): Statistics to update, allows keeping
+                statistics across connections.
+            recorder (FlightRecorder, optional): Recorder to record frames in.
+            capture (TrafficCapture, optional): Capture to write raw traffic to.
 
         Attributes:
             port (int): The port to connect to.
@@ -347,54 +994,131 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
         self.version = protocol_version
         self.dev_type = "type_0a"
         self.dps_to_request = {}
-        self.cipher = AESCipher(self.local_key)
+        self.exchanges = 0
+        self.detect_exchanges = 0
+        self.templates = compile_templates(dev_id)
+        self.cipher = get_cipher(self.local_key)
         self.seqno = 0
         self.transport = None
         self.listener = weakref.ref(listener)
+        self.stats = stats or ConnectionStats()
+        self.recorder = recorder or FlightRecorder()
+        self.recorder.decrypt = self._decrypt_payload
+        self.capture = capture
         self.dispatcher = self._setup_dispatcher()
         self.on_connected = on_connected
         self.heartbeater = None
+        self.heartbeat_timer = None
+        self.heartbeat_interval = heartbeat_interval
+        self.timers = timers or get_timer_scheduler()
+        self.heartbeats_sent = 0
+        self.heartbeats_saved = 0
+        self.last_received = 0.0
+        self.connect_latency = None
+        self.connected_at = None
+        self.scheduler = CommandScheduler()
         self.dps_cache = {}
 
     def _setup_dispatcher(self):
         def _status_update(msg):
-            decoded_message = self._decode_payload(msg.payload)
-            if "dps" in decoded_message:
-                self.dps_cache.update(decoded_message["dps"])
+            try:
+                decoded_message = self._decode_payload(msg.payload)
+            except Exception as ex:
+                self.stats.decode_errors += 1
+                self.warning("Failed to decode status update: %s", ex)
+                return
+
+            if not decoded_message or "dps" not in decoded_message:
+                return
+
+            # Devices often push values that did not change (e.g. power readings),
+            # only propagate the datapoints that actually changed
+            changed = self._update_dps_cache(decoded_message["dps"])
+            if not changed:
+                return
 
             listener = self.listener()
             if listener is not None:
-                listener.status_updated(self.dps_cache)
+                listener.status_updated(changed)
 
-        return MessageDispatcher(self.id, _status_update)
+        return MessageDispatcher(self.id, _status_update, self.stats, self.recorder)
 
     def connection_made(self, transport):
         """Did connect to the device."""
+        self.transport = transport
+        self.last_received = self.connected_at = self.loop.time()
+        if self.capture is not None:
+            self.capture.write(CAPTURE_CONNECT)
+        self.on_connected.set_result(True)
+        self.debug("Started heartbeats")
+        self._schedule_heartbeat(self.heartbeat_interval)
 
-        async def heartbeat_loop():
-            """Continuously send heart beat updates."""
-            self.debug("Started heartbeat loop")
-            while True:
-                try:
-                    await self.heartbeat()
-                except Exception as ex:
-                    self.exception("Heartbeat failed (%s), disconnecting", ex)
-                    break
-                await asyncio.sleep(HEARTBEAT_INTERVAL)
-            self.debug("Stopped heartbeat loop")
+    def _schedule_heartbeat(self, delay):
+        # Add some jitter to avoid heartbeats of many devices clustering
+        self.heartbeat_timer = self.timers.call_later(
+            delay, self._check_heartbeat, jitter=delay * HEARTBEAT_JITTER
+        )
+
+    def _check_heartbeat(self):
+        """Send a heartbeat if no data has been received for a while."""
+        self.heartbeat_timer = None
+        if self.transport is None:
+            return
+
+        # Any frame received from the device proves that the connection is alive,
+        # so only send a heartbeat after being idle for an interval
+        idle = self.loop.time() - self.last_received
+        if idle < self.heartbeat_interval:
+            self.heartbeats_saved += 1
+            self._schedule_heartbeat(self.heartbeat_interval - idle)
+        else:
+            self.heartbeater = self.loop.create_task(self._send_heartbeat())
+
+    async def _send_heartbeat(self):
+        try:
+            await self.heartbeat()
+        except asyncio.CancelledError:
+            # Subclass of Exception before Python 3.8, cancelled by close()
+            raise
+        except Exception as ex:
+            if isinstance(ex, asyncio.TimeoutError):
+                self.warning("Heartbeat timed out, disconnecting")
+            else:
+                self.exception("Heartbeat failed (%s), disconnecting", ex)
+            self.heartbeater = None
             self.close()
+            return
 
-        self.transport = transport
-        self.on_connected.set_result(True)
-        self.heartbeater = self.loop.create_task(heartbeat_loop())
+        self.heartbeater = None
+        self.heartbeats_sent += 1
+        if self.transport is not None:
+            self._schedule_heartbeat(self.heartbeat_interval)
+
+    def set_capture(self, capture):
+        """Start writing raw traffic to a capture, or stop if capture is None."""
+        if capture is not None and self.transport is not None:
+            capture.write(CAPTURE_CONNECT)
+        self.capture = capture
+
+    @property
+    def connected_time(self):
+        """Return seconds since connection was established."""
+        if self.connected_at is None:
+            return 0.0
+        return self.loop.time() - self.connected_at
 
     def data_received(self, data):
         """Received data from device."""
+        self.last_received = self.loop.time()
+        if self.capture is not None:
+            self.capture.write(CAPTURE_IN, data)
         self.dispatcher.add_data(data)
 
     def connection_lost(self, exc):
         """Disconnected from device."""
         self.debug("Connection lost: %s", exc)
+        if self.capture is not None:
+            self.capture.write(CAPTURE_DISCONNECT)
         try:
             self.close()
         except Exception:
@@ -410,6 +1134,9 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
     def close(self):
         """Close connection and abort all outstanding listeners."""
         self.debug("Closing connection")
+        if self.heartbeat_timer is not None:
+            self.heartbeat_timer.cancel()
+            self.heartbeat_timer = None
         if self.heartbeater is not None:
             self.heartbeater.cancel()
         if self.dispatcher is not None:
@@ -419,31 +1146,52 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
             self.transport = None
             transport.close()
 
-    async def exchange(self, command, dps=None):
-        """Send and receive a message, returning response from device."""
+    async def exchange(self, command, dps=None, priority=None):
+        """Send and receive a message, returning response from device.
+
+        Commands changing state are interactive by default and preempt all other
+        (background) commands.
+        """
+        if priority is None:
+            priority = PRIORITY_INTERACTIVE if command == SET else PRIORITY_BACKGROUND
+
+        async with self.scheduler.slot(priority):
+            return await self._exchange(command, dps)
+
+    async def _exchange(self, command, dps):
         self.debug(
             "Sending command %s (device type: %s)",
             command,
             self.dev_type,
         )
+        cmd = self.templates[self.dev_type][command].hexbyte
         payload = self._generate_payload(command, dps)
         dev_type = self.dev_type
-
-        # Wait for special sequence number if heartbeat
-        seqno = (
-            MessageDispatcher.HEARTBEAT_SEQNO
-            if command == HEARTBEAT
-            else (self.seqno - 1)
-        )
+        seqno = self.seqno - 1
 
         self.transport.write(payload)
-        msg = await self.dispatcher.wait_for(seqno)
+        if self.capture is not None:
+            self.capture.write(CAPTURE_OUT, payload)
+        self.exchanges += 1
+        self.stats.frames_out += 1
+        self.stats.bytes_out += len(payload)
+        started = self.loop.time()
+        try:
+            msg = await self.dispatcher.wait_for(seqno, cmd)
+        except asyncio.TimeoutError:
+            self.stats.timeouts += 1
+            raise
         if msg is None:
             self.debug("Wait was aborted for seqno %d", seqno)
             return None
+        self.stats.add_rtt(command, self.loop.time() - started)
 
         # TODO: Verify stuff, e.g. CRC sequence number?
-        payload = self._decode_payload(msg.payload)
+        try:
+            payload = self._decode_payload(msg.payload)
+        except Exception:
+            self.stats.decode_errors += 1
+            raise
 
         # Perform a new exchange (once) if we switched device type
         if dev_type != self.dev_type:
@@ -453,14 +1201,14 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
                 dev_type,
                 self.dev_type,
             )
-            return await self.exchange(command, dps)
+            return await self._exchange(command, dps)
         return payload
 
     async def status(self):
         """Return device status."""
         status = await self.exchange(STATUS)
         if status and "dps" in status:
-            self.dps_cache.update(status["dps"])
+            self._update_dps_cache(status["dps"])
         return self.dps_cache
 
     async def heartbeat(self):
@@ -482,32 +1230,83 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
         return await self.exchange(SET, dps)
 
     async def detect_available_dps(self):
-        """Return which datapoints are supported by the device."""
-        # type_0d devices need a sort of bruteforce querying in order to detect the
-        # list of available dps experience shows that the dps available are usually
-        # in the ranges [1-25] and [100-110] need to split the bruteforcing in
-        # different steps due to request payload limitation (max. length = 255)
-        self.dps_cache = {}
-        ranges = [(2, 11), (11, 21), (21, 31), (100, 111)]
+        """Return which datapoints are supported by the device.
 
-        for dps_range in ranges:
-            # dps 1 must always be sent, otherwise it might fail in case no dps is found
-            # in the requested range
+        type_0d devices only report the datapoints that are requested. All of
+        DP_SEED is probed, then up to DP_PROBE_STEP around every datapoint found
+        outside of it, until no more datapoints are found. Each request includes
+        as many datapoints as fit. The number of exchanges used is available as
+        detect_exchanges afterwards.
+        """
+        self.dps_cache = {}
+        exchanges = self.exchanges
+        template = self.templates["type_0d"][STATUS]
+        probed = set()
+        candidates = list(DP_SEED)
+
+        while candidates:
+            # dps 1 must always be sent, otherwise it might fail in case no dps is
+            # found in the requested range
             self.dps_to_request = {"1": None}
-            self.add_dps_to_request(range(*dps_range))
+            sent = 0
+            for dp in candidates:
+                self.dps_to_request[str(dp)] = None
+                if len(template.render(self.dps_to_request)) > MAX_PAYLOAD_SIZE:
+                    del self.dps_to_request[str(dp)]
+                    break
+                sent += 1
+            probed.update(candidates[:sent])
+
             try:
-                data = await self.status()
+                await self.status()
             except Exception as e:
                 self.exception("Failed to get status: %s", e)
                 raise
-            if "dps" in data:
-                self.dps_cache.update(data["dps"])
 
+            # type_0a devices report all datapoints regardless of request
             if self.dev_type == "type_0a":
-                return self.dps_cache
-        self.debug("Detected dps: %s", self.dps_cache)
+                break
+
+            found = {int(dp) for dp in self.dps_cache if dp.isdigit()}
+            candidates = candidates[sent:] + _dps_next_to(found, probed)
+
+        self.dps_to_request = dict.fromkeys(self.dps_cache)
+
+        self.detect_exchanges = self.exchanges - exchanges
+        self.debug(
+            "Detected dps using %d exchanges: %s", self.detect_exchanges, self.dps_cache
+        )
         return self.dps_cache
 
+    def _update_dps_cache(self, dps):
+        """Merge datapoints into cache and return the ones that changed."""
+        dps_cache = self.dps_cache
+        changed = {
+            dp: value
+            for dp, value in dps.items()
+            if dp not in dps_cache or dps_cache[dp] != value
+        }
+        dps_cache.update(changed)
+        return changed
+
+    def fingerprint(self):
+        """Return what has been learned about the device during the session.
+
+        The result is JSON serializable and can be passed to restore_fingerprint
+        for later connections to skip detecting device type again.
+        """
+        return {
+            "dev_type": self.dev_type,
+            "dps_to_request": list(self.dps_to_request),
+        }
+
+    def restore_fingerprint(self, fingerprint):
+        """Restore device information returned by fingerprint."""
+        dev_type = fingerprint.get("dev_type")
+        if dev_type in self.templates:
+            self.dev_type = dev_type
+        self.add_dps_to_request(fingerprint.get("dps_to_request", []))
+
     def add_dps_to_request(self, dp_indicies):
         """Add a datapoint (DP) to be included in requests."""
         if isinstance(dp_indicies, int):
@@ -515,37 +1314,38 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
         else:
             self.dps_to_request.update({str(index): None for index in dp_indicies})
 
-    def _decode_payload(self, payload):
+    def _decrypt_payload(self, payload):
+        """Return decrypted payload of a received frame."""
         if not payload:
-            payload = "{}"
-        elif payload.startswith(b"{"):
-            payload = payload
-        elif payload.startswith(PROTOCOL_VERSION_BYTES_31):
+            return b"{}"
+        if payload.startswith(b"{"):
+            return payload
+        if payload.startswith(PROTOCOL_VERSION_BYTES_31):
             payload = payload[len(PROTOCOL_VERSION_BYTES_31) :]  # remove version header
             # remove (what I'm guessing, but not confirmed is) 16-bytes of MD5
             # hexdigest of payload
-            payload = self.cipher.decrypt(payload[16:])
-        elif self.version == 3.3:
+            return self.cipher.decrypt(payload[16:])
+        if self.version == 3.3:
             if self.dev_type != "type_0a" or payload.startswith(
                 PROTOCOL_VERSION_BYTES_33
             ):
                 payload = payload[len(PROTOCOL_33_HEADER) :]
-            payload = self.cipher.decrypt(payload, False)
+            return self.cipher.decrypt(payload, False)
+        raise Exception(f"Unexpected payload={payload}")
 
-            if "data unvalid" in payload:
-                self.dev_type = "type_0d"
-                self.debug(
-                    "switching to dev_type %s",
-                    self.dev_type,
-                )
-                return None
-        else:
-            raise Exception(f"Unexpected payload={payload}")
+    def _decode_payload(self, payload):
+        payload = self._decrypt_payload(payload)
+
+        if b"data unvalid" in payload:
+            self.dev_type = "type_0d"
+            self.debug(
+                "switching to dev_type %s",
+                self.dev_type,
+            )
+            return None
 
-        if not isinstance(payload, str):
-            payload = payload.decode()
         self.debug("Decrypted payload: %s", payload)
-        return json.loads(payload)
+        return JSON_CODEC.loads(payload)
 
     def _generate_payload(self, command, data=None):
         """
@@ -553,30 +1353,19 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
 
         Args:
             command(str): The type of command.
-                This is one of the entries from payload_dict
+                This is one of the entries from PAYLOAD_DICT
             data(dict, optional): The data to be send.
                 This is what will be passed via the 'dps' entry
         """
-        cmd_data = PAYLOAD_DICT[self.dev_type][command]
-        json_data = cmd_data["command"]
-        command_hb = cmd_data["hexByte"]
-
-        if "gwId" in json_data:
-            json_data["gwId"] = self.id
-        if "devId" in json_data:
-            json_data["devId"] = self.id
-        if "uid" in json_data:
-            json_data["uid"] = self.id  # still use id, no separate uid
-        if "t" in json_data:
-            json_data["t"] = str(int(time.time()))
-
-        if data is not None:
-            json_data["dps"] = data
+        template = self.templates[self.dev_type][command]
+        command_hb = template.hexbyte
+
         if command_hb == 0x0D:
-            json_data["dps"] = self.dps_to_request
+            data = self.dps_to_request
 
-        payload = json.dumps(json_data).replace(" ", "").encode("utf-8")
+        payload = template.render(data)
         self.debug("Send payload: %s", payload)
+        plaintext = payload
 
         if self.version == 3.3:
             payload = self.cipher.encrypt(payload, False)
@@ -604,13 +1393,31 @@ class TuyaProtocol(asyncio.Protocol, ContextualLogger):
 
         msg = TuyaMessage(self.seqno, command_hb, 0, payload, 0)
         self.seqno += 1
-        return pack_message(msg)
+        frame = pack_message(msg)
+        self.recorder.record(
+            FRAME_OUT, command_hb, msg.seqno, len(frame), None, plaintext
+        )
+        return frame
 
     def __repr__(self):
         """Return internal string representation of object."""
         return self.id
 
 
+def _configure_socket(sock):
+    """Enable detection of dead connections on a socket, where supported."""
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    options = [
+        ("TCP_KEEPIDLE", KEEPALIVE_IDLE),
+        ("TCP_KEEPINTVL", KEEPALIVE_INTERVAL),
+        ("TCP_KEEPCNT", KEEPALIVE_COUNT),
+        ("TCP_USER_TIMEOUT", USER_TIMEOUT * 1000),
+    ]
+    for name, value in options:
+        if hasattr(socket, name):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, name), value)
+
+
 async def connect(
     address,
     device_id,
@@ -618,22 +1425,49 @@ async def connect(
     protocol_version,
     listener=None,
     port=6668,
-    timeout=5,
+    timeout=CONNECT_TIMEOUT,
+    heartbeat_interval=HEARTBEAT_INTERVAL,
+    timers=None,
+    stats=None,
+    recorder=None,
+    capture=None,
 ):
-    """Connect to a device."""
+    """Connect to a device.
+
+    Raises asyncio.TimeoutError if no connection was established within timeout
+    seconds. The time it took to connect is available as connect_latency on the
+    returned protocol.
+    """
     loop = asyncio.get_running_loop()
     on_connected = loop.create_future()
-    _, protocol = await loop.create_connection(
-        lambda: TuyaProtocol(
-            device_id,
-            local_key,
-            protocol_version,
-            on_connected,
-            listener or EmptyListener(),
+    started = loop.time()
+    transport, protocol = await asyncio.wait_for(
+        loop.create_connection(
+            lambda: TuyaProtocol(
+                device_id,
+                local_key,
+                protocol_version,
+                on_connected,
+                listener or EmptyListener(),
+                heartbeat_interval,
+                timers,
+                stats,
+                recorder,
+                capture,
+            ),
+            address,
+            port,
         ),
-        address,
-        port,
+        timeout=timeout,
     )
 
+    sock = transport.get_extra_info("socket")
+    if sock is not None:
+        try:
+            _configure_socket(sock)
+        except OSError as ex:
+            protocol.debug("Failed to enable keepalive: %s", ex)
+
     await asyncio.wait_for(on_connected, timeout=timeout)
+    protocol.connect_latency = loop.time() - started
     return protocol
@@ -1,17 +1,47 @@
 """Platform to present any Tuya DP as a sensor."""
 import logging
+from collections import deque
+from datetime import timedelta
 from functools import partial
 
 import voluptuous as vol
 from homeassistant.components.sensor import DEVICE_CLASSES, DOMAIN
+from homeassistant.components.switch import DOMAIN as SWITCH_DOMAIN
 from homeassistant.const import (
     CONF_DEVICE_CLASS,
+    CONF_DEVICE_ID,
+    CONF_FRIENDLY_NAME,
+    CONF_ID,
     CONF_UNIT_OF_MEASUREMENT,
+    DEVICE_CLASS_POWER,
+    DEVICE_CLASS_VOLTAGE,
+    POWER_WATT,
     STATE_UNKNOWN,
+    TIME_MILLISECONDS,
+    TIME_SECONDS,
+    VOLT,
 )
+from homeassistant.core import callback
+from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.event import async_track_time_interval
 
-from .common import LocalTuyaEntity, async_setup_entry
-from .const import CONF_SCALING
+from .common import LocalTuyaEntity, device_info, prepare_setup_entities
+from .common import async_setup_entry as async_setup_platform_entry
+from .const import (
+    ATTR_MAX,
+    ATTR_MIN,
+    CONF_AVERAGE_WINDOW,
+    CONF_CURRENT,
+    CONF_CURRENT_CONSUMPTION,
+    CONF_DEADBAND,
+    CONF_DEADBAND_PERCENT,
+    CONF_MAX_INTERVAL,
+    CONF_MIN_INTERVAL,
+    CONF_SCALING,
+    CONF_VOLTAGE,
+    TUYA_DEVICE,
+)
+from .const import DOMAIN as LOCALTUYA_DOMAIN
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -26,11 +56,23 @@ def flow_schema(dps):
         vol.Optional(CONF_SCALING): vol.All(
             vol.Coerce(float), vol.Range(min=-1000000.0, max=1000000.0)
         ),
+        vol.Optional(CONF_DEADBAND): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(CONF_DEADBAND_PERCENT): vol.All(
+            vol.Coerce(float), vol.Range(min=0, max=100)
+        ),
+        vol.Optional(CONF_MIN_INTERVAL): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(CONF_MAX_INTERVAL): vol.All(vol.Coerce(float), vol.Range(min=0)),
     }
 
 
 class LocaltuyaSensor(LocalTuyaEntity):
-    """Representation of a Tuya sensor."""
+    """Representation of a Tuya sensor.
+
+    Devices like power plugs push new values every few seconds, so updates can
+    be filtered before they are written to Home Assistant: changes within the
+    deadband are ignored, at most one state is written per min_interval and
+    ignored changes are written anyway once max_interval has passed.
+    """
 
     def __init__(
         self,
@@ -42,6 +84,18 @@ class LocaltuyaSensor(LocalTuyaEntity):
         """Initialize the Tuya sensor."""
         super().__init__(device, config_entry, sensorid, _LOGGER, **kwargs)
         self._state = STATE_UNKNOWN
+        self._latest = STATE_UNKNOWN
+        self._published_at = None
+        self._publish_timer = None
+        self._deadband = self._config.get(CONF_DEADBAND, 0)
+        self._deadband_percent = self._config.get(CONF_DEADBAND_PERCENT, 0)
+        self._min_interval = self._config.get(CONF_MIN_INTERVAL, 0)
+        self._max_interval = self._config.get(CONF_MAX_INTERVAL)
+
+    async def async_will_remove_from_hass(self):
+        """Cancel pending state update."""
+        await super().async_will_remove_from_hass()
+        self._cancel_publish_timer()
 
     @property
     def state(self):
@@ -58,13 +112,359 @@ class LocaltuyaSensor(LocalTuyaEntity):
         """Return the unit of measurement of this entity, if any."""
         return self._config.get(CONF_UNIT_OF_MEASUREMENT)
 
-    def status_updated(self):
-        """Device status was updated."""
+    def _read_state(self):
+        """Return current state of the datapoint."""
         state = self.dps(self._dp_id)
         scale_factor = self._config.get(CONF_SCALING)
         if scale_factor is not None and isinstance(state, (int, float)):
             state = round(state * scale_factor, DEFAULT_PRECISION)
-        self._state = state
+        return state
+
+    def status_updated(self):
+        """Device status was updated."""
+        return self._update_state(self._read_state())
+
+    def _update_state(self, state):
+        """Filter a new state, return if it should be written right away."""
+        self._latest = state
+
+        now = self.hass.loop.time()
+        if self._published_at is None:
+            self._publish(now)
+            return True
+
+        elapsed = now - self._published_at
+        if self._is_significant(state):
+            if elapsed >= self._min_interval:
+                self._publish(now)
+                return True
+            delay = self._min_interval - elapsed
+        elif state == self._state:
+            delay = None
+        elif self._max_interval is not None:
+            if elapsed >= self._max_interval:
+                self._publish(now)
+                return True
+            delay = self._max_interval - elapsed
+        else:
+            delay = None
+
+        self._device.suppressed_updates += 1
+        if delay is not None:
+            self._schedule_publish(delay)
+        return False
+
+    def _is_significant(self, state):
+        """Return if state differs more than the deadband from current state."""
+        current = self._state
+        if not isinstance(state, (int, float)) or not isinstance(current, (int, float)):
+            return state != current
+        deadband = max(self._deadband, abs(current) * self._deadband_percent / 100)
+        change = abs(state - current)
+        return change > deadband if deadband else change > 0
+
+    def _publish(self, now):
+        self._cancel_publish_timer()
+        self._state = self._latest
+        self._published_at = now
+
+    def _schedule_publish(self, delay):
+        """Write latest state after delay, unless written before that."""
+        if self._publish_timer is not None:
+            # Keep the earliest pending update, the latest state is used anyway
+            if self._publish_timer.when() <= self.hass.loop.time() + delay:
+                return
+            self._publish_timer.cancel()
+
+        def _write_latest():
+            self._publish_timer = None
+            self._publish(self.hass.loop.time())
+            self.async_write_ha_state()
+
+        self._publish_timer = self.hass.loop.call_later(delay, _write_latest)
+
+    def _cancel_publish_timer(self):
+        if self._publish_timer is not None:
+            self._publish_timer.cancel()
+            self._publish_timer = None
+
+
+class WindowedStats:
+    """Time weighted mean, minimum and maximum of a value within a time window.
+
+    A sample holds from when it was added until the next one, and the sample in
+    effect at the start of the window is kept, so a steady value still fills the
+    window. Adding a sample is amortized O(1): the area under the samples is
+    kept as a running sum and minimum and maximum as monotonic queues.
+    """
+
+    def __init__(self, window):
+        """Initialize a new WindowedStats."""
+        self.window = window
+        self._samples = deque()
+        self._area = 0.0
+        self._min = deque()
+        self._max = deque()
+        self._seqno = 0
+
+    def __len__(self):
+        """Return number of samples in effect within the window."""
+        return len(self._samples)
+
+    def add(self, now, value):
+        """Add a sample of a value holding from now on."""
+        if self._samples:
+            last_time, _, last_value = self._samples[-1]
+            self._area += last_value * (now - last_time)
+
+        seqno = self._seqno
+        self._seqno += 1
+        self._samples.append((now, seqno, value))
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((seqno, value))
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((seqno, value))
+        self.expire(now)
+
+    def expire(self, now):
+        """Drop samples no longer in effect within the window ending at now."""
+        samples = self._samples
+        start = now - self.window
+        while len(samples) > 1 and samples[1][0] <= start:
+            time, seqno, value = samples.popleft()
+            self._area -= value * (samples[0][0] - time)
+            if self._min[0][0] == seqno:
+                self._min.popleft()
+            if self._max[0][0] == seqno:
+                self._max.popleft()
+        if len(samples) == 1:
+            # Avoid accumulating rounding errors
+            self._area = 0.0
+
+    def mean(self, now):
+        """Return mean over the window ending at now, weighted by time."""
+        self.expire(now)
+        first_time, _, first_value = self._samples[0]
+        last_time, _, last_value = self._samples[-1]
+        start = max(first_time, now - self.window)
+        if now <= start:
+            return last_value
+        area = (
+            self._area
+            - first_value * (start - first_time)
+            + last_value * (now - last_time)
+        )
+        return area / (now - start)
+
+    @property
+    def min(self):
+        """Return smallest value in window as of the last update."""
+        return self._min[0][1]
+
+    @property
+    def max(self):
+        """Return largest value in window as of the last update."""
+        return self._max[0][1]
+
+
+# Number of times per averaging window the mean is updated without new values
+RESAMPLES_PER_WINDOW = 10
+
+# Power metering datapoints of switches exposed as sensors:
+# config key: (name, unit, device class, scale factor)
+POWER_SENSORS = {
+    CONF_CURRENT: ("Current", "mA", None, 1),
+    CONF_CURRENT_CONSUMPTION: ("Power", POWER_WATT, DEVICE_CLASS_POWER, 0.1),
+    CONF_VOLTAGE: ("Voltage", VOLT, DEVICE_CLASS_VOLTAGE, 0.1),
+}
+
+
+class LocaltuyaPowerSensor(LocaltuyaSensor):
+    """Power metering datapoint of a switch, optionally averaged over a window."""
+
+    def __init__(self, device, config_entry, switchid, key):
+        """Initialize the power sensor."""
+        super().__init__(device, config_entry, switchid)
+        self._key = key
+        self._name, self._unit, self._device_class, self._scale = POWER_SENSORS[key]
+        # Follow the power metering datapoint instead of the switch
+        self._dp_id = self._config[key]
+        self._dps = {str(self._dp_id)}
+        window = self._config.get(CONF_AVERAGE_WINDOW)
+        self._window = WindowedStats(window) if window else None
+
+    async def async_added_to_hass(self):
+        """Start re-sampling the value if averaging."""
+        await super().async_added_to_hass()
+        if self._window is not None:
+            interval = max(self._window.window / RESAMPLES_PER_WINDOW, 1)
+            self.async_on_remove(
+                async_track_time_interval(
+                    self.hass, self._async_resample, timedelta(seconds=interval)
+                )
+            )
+
+    @callback
+    def _async_resample(self, now):
+        """Update mean, as it changes over time without updates from the device."""
+        if not self.available:
+            return
+        state = self._read_state()
+        if state != self._latest and self._update_state(state):
+            self.async_write_ha_state()
+
+    @property
+    def name(self):
+        """Get name of sensor."""
+        return f"{self._config[CONF_FRIENDLY_NAME]} {self._name}"
+
+    @property
+    def unique_id(self):
+        """Return unique sensor identifier."""
+        return (
+            f"local_{self._config_entry.data[CONF_DEVICE_ID]}"
+            f"_{self._config[CONF_ID]}_{self._key}"
+        )
+
+    @property
+    def device_class(self):
+        """Return the class of this device."""
+        return self._device_class
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit of measurement of this entity, if any."""
+        return self._unit
+
+    @property
+    def device_state_attributes(self):
+        """Return minimum and maximum in window if averaging."""
+        if not self._window:
+            return None
+        return {
+            ATTR_MIN: self._scaled(self._window.min),
+            ATTR_MAX: self._scaled(self._window.max),
+        }
+
+    def _scaled(self, value):
+        return round(value * self._scale, DEFAULT_PRECISION)
+
+    def _read_state(self):
+        """Return current value, or mean over the window if averaging."""
+        value = self.dps(self._dp_id)
+        if not isinstance(value, (int, float)):
+            return value
+        if self._window is None:
+            return self._scaled(value)
+        # The last known value is added again when re-sampling, it still holds
+        now = self.hass.loop.time()
+        self._window.add(now, value)
+        return self._scaled(self._window.mean(now))
+
+
+def _milliseconds(seconds):
+    return None if seconds is None else round(seconds * 1000)
+
+
+# Connection statistics exposed as sensors, disabled by default:
+# key: (name, unit, function returning value from TuyaDevice)
+DIAGNOSTIC_SENSORS = {
+    "rtt": (
+        "Round Trip Time",
+        TIME_MILLISECONDS,
+        lambda device: _milliseconds(device.stats.rtt.percentile(50)),
+    ),
+    "rtt_p95": (
+        "Round Trip Time p95",
+        TIME_MILLISECONDS,
+        lambda device: _milliseconds(device.stats.rtt.percentile(95)),
+    ),
+    "timeouts": ("Timeouts", None, lambda device: device.stats.timeouts),
+    "decode_errors": ("Decode Errors", None, lambda device: device.stats.decode_errors),
+    "frames_received": ("Frames Received", None, lambda device: device.stats.frames_in),
+    "reconnects": ("Reconnects", None, lambda device: device.reconnects),
+    "suppressed_updates": (
+        "Suppressed Updates",
+        None,
+        lambda device: device.suppressed_updates,
+    ),
+    "connected_time": (
+        "Connected Time",
+        TIME_SECONDS,
+        lambda device: round(device.connected_time),
+    ),
+}
+
+
+class LocaltuyaDiagnosticSensor(Entity):
+    """Sensor exposing connection statistics of a Tuya device."""
+
+    def __init__(self, device, config_entry, key):
+        """Initialize the diagnostic sensor."""
+        self._device = device
+        self._config_entry = config_entry
+        self._key = key
+        self._name, self._unit, self._value = DIAGNOSTIC_SENSORS[key]
+
+    @property
+    def name(self):
+        """Get name of sensor."""
+        return f"{self._config_entry.data[CONF_FRIENDLY_NAME]} {self._name}"
+
+    @property
+    def unique_id(self):
+        """Return unique sensor identifier."""
+        return f"local_{self._config_entry.data[CONF_DEVICE_ID]}_{self._key}"
+
+    @property
+    def device_info(self):
+        """Return device information for the device registry."""
+        return device_info(self._config_entry)
+
+    @property
+    def entity_registry_enabled_default(self):
+        """Return if the entity should be enabled when first added."""
+        return False
+
+    @property
+    def state(self):
+        """Return sensor state."""
+        return self._value(self._device)
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit of measurement of this entity, if any."""
+        return self._unit
+
+
+_async_setup_entry = partial(
+    async_setup_platform_entry, DOMAIN, LocaltuyaSensor, flow_schema
+)
+
+
+async def async_setup_entry(hass, config_entry, async_add_entities):
+    """Set up sensors for datapoints, switch power metering and diagnostics."""
+    await _async_setup_entry(hass, config_entry, async_add_entities)
 
+    device = hass.data[LOCALTUYA_DOMAIN][config_entry.entry_id][TUYA_DEVICE]
+    _, switches = prepare_setup_entities(hass, config_entry, SWITCH_DOMAIN)
+    power_sensors = []
+    for switch_config in switches or []:
+        for key in POWER_SENSORS:
+            if switch_config.get(key) not in (None, "-1"):
+                device._dps_to_request[switch_config[key]] = None
+                power_sensors.append(
+                    LocaltuyaPowerSensor(
+                        device, config_entry, switch_config[CONF_ID], key
+                    )
+                )
 
-async_setup_entry = partial(async_setup_entry, DOMAIN, LocaltuyaSensor, flow_schema)
+    async_add_entities(
+        power_sensors
+        + [
+            LocaltuyaDiagnosticSensor(device, config_entry, key)
+            for key in DIAGNOSTIC_SENSORS
+        ]
+    )
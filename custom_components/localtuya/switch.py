@@ -7,9 +7,7 @@ from homeassistant.components.switch import DOMAIN, SwitchEntity
 
 from .common import LocalTuyaEntity, async_setup_entry
 from .const import (
-    ATTR_CURRENT,
-    ATTR_CURRENT_CONSUMPTION,
-    ATTR_VOLTAGE,
+    CONF_AVERAGE_WINDOW,
     CONF_CURRENT,
     CONF_CURRENT_CONSUMPTION,
     CONF_VOLTAGE,
@@ -17,6 +15,10 @@ from .const import (
 
 _LOGGER = logging.getLogger(__name__)
 
+# Datapoints besides the relay the switch is updated on. Power metering fields
+# are still requested from the device, but only the sensors subscribe to them.
+SUBSCRIBED_CONFIG_FIELDS = ()
+
 
 def flow_schema(dps):
     """Return schema used in config flow."""
@@ -24,21 +26,36 @@ def flow_schema(dps):
         vol.Optional(CONF_CURRENT): vol.In(dps),
         vol.Optional(CONF_CURRENT_CONSUMPTION): vol.In(dps),
         vol.Optional(CONF_VOLTAGE): vol.In(dps),
+        vol.Optional(CONF_AVERAGE_WINDOW): vol.All(
+            vol.Coerce(int), vol.Range(min=0, max=86400)
+        ),
     }
 
 
 class LocaltuyaSwitch(LocalTuyaEntity, SwitchEntity):
-    """Representation of a Tuya switch."""
+    """Representation of a Tuya switch.
+
+    Power metering datapoints of the switch are set up as sensors by the sensor
+    platform, so the switch state only changes with the relay.
+    """
 
     def __init__(
         self,
         device,
         config_entry,
         switchid,
+        dps_config_fields=(),
         **kwargs,
     ):
         """Initialize the Tuya switch."""
-        super().__init__(device, config_entry, switchid, _LOGGER, **kwargs)
+        super().__init__(
+            device,
+            config_entry,
+            switchid,
+            _LOGGER,
+            dps_config_fields=SUBSCRIBED_CONFIG_FIELDS,
+            **kwargs,
+        )
         self._state = None
         print("Initialized switch [{}]".format(self.name))
 
@@ -47,20 +64,6 @@ class LocaltuyaSwitch(LocalTuyaEntity, SwitchEntity):
         """Check if Tuya switch is on."""
         return self._state
 
-    @property
-    def device_state_attributes(self):
-        """Return device state attributes."""
-        attrs = {}
-        if self.has_config(CONF_CURRENT):
-            attrs[ATTR_CURRENT] = self.dps(self._config[CONF_CURRENT])
-        if self.has_config(CONF_CURRENT_CONSUMPTION):
-            attrs[ATTR_CURRENT_CONSUMPTION] = (
-                self.dps(self._config[CONF_CURRENT_CONSUMPTION]) / 10
-            )
-        if self.has_config(CONF_VOLTAGE):
-            attrs[ATTR_VOLTAGE] = self.dps(self._config[CONF_VOLTAGE]) / 10
-        return attrs
-
     async def async_turn_on(self, **kwargs):
         """Turn Tuya switch on."""
         await self._device.set_dp(True, self._dp_id)
@@ -0,0 +1 @@
+"""Tests for the localtuya integration."""
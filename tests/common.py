@@ -0,0 +1,84 @@
+"""Helpers for setting up devices without a running Home Assistant."""
+from types import SimpleNamespace
+
+from homeassistant.const import (
+    CONF_DEVICE_ID,
+    CONF_ENTITIES,
+    CONF_FRIENDLY_NAME,
+    CONF_HOST,
+    CONF_ID,
+    CONF_PLATFORM,
+)
+
+from custom_components.localtuya.common import DeviceStore, TuyaDevice
+from custom_components.localtuya.const import (
+    CONF_LOCAL_KEY,
+    CONF_PROTOCOL_VERSION,
+    DATA_STORE,
+    DOMAIN,
+)
+
+
+class MockStore(DeviceStore):
+    """DeviceStore only keeping data in memory."""
+
+    def __init__(self):
+        """Initialize a new MockStore."""
+        self._devices = {}
+        self._save_pending = False
+
+    def _schedule_save(self):
+        pass
+
+
+class MockInterface:
+    """Stand-in for TuyaProtocol recording commands sent to the device."""
+
+    def __init__(self):
+        """Initialize a new MockInterface."""
+        self.commands = []
+        self.busy = None
+
+    async def set_dps(self, dps):
+        """Record command and wait until no longer busy."""
+        self.commands.append(dps)
+        if self.busy is not None:
+            await self.busy.wait()
+        return {"dps": dps}
+
+    def close(self):
+        """Close connection."""
+
+
+def mock_hass(loop):
+    """Return the parts of a Home Assistant instance used by TuyaDevice."""
+    return SimpleNamespace(
+        loop=loop,
+        data={DOMAIN: {DATA_STORE: MockStore()}},
+        config=SimpleNamespace(components=set()),
+        async_create_task=loop.create_task,
+        async_add_executor_job=lambda target, *args: loop.run_in_executor(
+            None, target, *args
+        ),
+    )
+
+
+def device_config(device_id="bf0123456789abcdefgh", **options):
+    """Return config for a device with a single switch."""
+    config = {
+        CONF_DEVICE_ID: device_id,
+        CONF_FRIENDLY_NAME: "Plug",
+        CONF_HOST: "127.0.0.1",
+        CONF_LOCAL_KEY: "0123456789abcdef",
+        CONF_PROTOCOL_VERSION: "3.3",
+        CONF_ENTITIES: [{CONF_ID: 1, CONF_PLATFORM: "switch"}],
+    }
+    config.update(options)
+    return config
+
+
+def connected_device(hass, **options):
+    """Return a TuyaDevice connected to a MockInterface."""
+    device = TuyaDevice(hass, device_config(**options))
+    device._interface = MockInterface()
+    return device
@@ -0,0 +1,165 @@
+"""Tests for admission control of device connections."""
+import asyncio
+
+from homeassistant.components import automation
+import pytest
+
+from custom_components.localtuya import pytuya
+from custom_components.localtuya.common import ConnectionAdmission
+
+from .common import connected_device, mock_hass
+
+
+async def connect(admission, name, priority, admitted, release):
+    """Hold a connection slot until release is set."""
+    async with admission.slot(priority):
+        admitted.append(name)
+        await release.wait()
+
+
+async def settle():
+    """Let all ready tasks run."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_concurrency_limit():
+    """Test that no more than limit devices connect at the same time."""
+
+    async def _test():
+        admission = ConnectionAdmission(mock_hass(asyncio.get_running_loop()), 2, 0)
+        admitted = []
+        releases = [asyncio.Event() for _ in range(4)]
+        for index, release in enumerate(releases):
+            asyncio.ensure_future(connect(admission, index, 0, admitted, release))
+        await settle()
+        progress = [list(admitted)]
+
+        releases[1].set()
+        await settle()
+        progress.append(list(admitted))
+
+        for release in releases:
+            release.set()
+        await settle()
+        return progress, admitted, admission._active
+
+    progress, admitted, active = asyncio.run(_test())
+    assert progress == [[0, 1], [0, 1, 2]]
+    assert admitted == [0, 1, 2, 3]
+    assert active == 0
+
+
+def test_slot_released_on_error():
+    """Test that a failing connection attempt gives its slot back."""
+
+    async def _test():
+        admission = ConnectionAdmission(mock_hass(asyncio.get_running_loop()), 1, 0)
+        with pytest.raises(OSError):
+            async with admission.slot(0):
+                raise OSError("Host unreachable")
+
+        admitted = []
+        release = asyncio.Event()
+        release.set()
+        await asyncio.wait_for(connect(admission, "next", 0, admitted, release), 1)
+        return admitted, admission._active
+
+    assert asyncio.run(_test()) == (["next"], 0)
+
+
+def test_cancelled_while_waiting():
+    """Test that a device cancelled while waiting does not hold a slot."""
+
+    async def _test():
+        admission = ConnectionAdmission(mock_hass(asyncio.get_running_loop()), 1, 0)
+        admitted = []
+        release = asyncio.Event()
+        asyncio.ensure_future(connect(admission, "first", 0, admitted, release))
+        waiting = asyncio.ensure_future(
+            connect(admission, "cancelled", 0, admitted, release)
+        )
+        asyncio.ensure_future(connect(admission, "last", 0, admitted, release))
+        await settle()
+
+        waiting.cancel()
+        release.set()
+        await settle()
+        return admitted, admission._active
+
+    assert asyncio.run(_test()) == (["first", "last"], 0)
+
+
+def test_ramp_spaces_connections():
+    """Test that connections are started at most ramp times per second."""
+
+    async def _test():
+        loop = asyncio.get_running_loop()
+        admission = ConnectionAdmission(mock_hass(loop), 10, 20)
+        started = []
+        release = asyncio.Event()
+        release.set()
+        await asyncio.gather(
+            *[connect(admission, loop.time(), 0, started, release) for _ in range(3)]
+        )
+        return admission._last_admitted - admission._started
+
+    assert asyncio.run(_test()) >= 0.1
+
+
+def test_automation_devices_admitted_first(monkeypatch):
+    """Test that devices used by automations connect before other devices."""
+    monkeypatch.setattr(
+        automation,
+        "automations_with_entity",
+        lambda hass, entity_id: ["automation.lights"]
+        if entity_id == "switch.used"
+        else [],
+    )
+
+    async def _test():
+        hass = mock_hass(asyncio.get_running_loop())
+        hass.config.components.add("automation")
+        admission = ConnectionAdmission(hass, 1, 0)
+        admitted = []
+        release = asyncio.Event()
+        asyncio.ensure_future(connect(admission, "busy", 0, admitted, release))
+        await settle()
+
+        for index, entity_id in enumerate(
+            ["switch.unused", "switch.used", "switch.other"]
+        ):
+            device = connected_device(hass, device_id=f"device{index}")
+            device.async_add_entity(entity_id)
+            asyncio.ensure_future(
+                connect(
+                    admission,
+                    entity_id,
+                    device._connection_priority(),
+                    admitted,
+                    release,
+                )
+            )
+        await settle()
+
+        release.set()
+        await settle()
+        return admitted
+
+    assert asyncio.run(_test()) == [
+        "busy",
+        "switch.used",
+        "switch.unused",
+        "switch.other",
+    ]
+
+
+def test_no_priority_without_automation():
+    """Test that all devices have the same priority without automation set up."""
+
+    async def _test():
+        device = connected_device(mock_hass(asyncio.get_running_loop()))
+        device.async_add_entity("switch.used")
+        return device._connection_priority()
+
+    assert asyncio.run(_test()) == pytuya.PRIORITY_BACKGROUND
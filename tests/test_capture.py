@@ -0,0 +1,101 @@
+"""Tests for capturing raw traffic and replaying captures."""
+import asyncio
+
+from benchmarks.make_traces import _frame, _json
+from benchmarks.replay import Replay
+from custom_components.localtuya import common, pytuya
+
+from .common import device_config, mock_hass
+
+DEVICE_ID = "bf0123456789abcdefgh"
+LOCAL_KEY = "0123456789abcdef"
+
+
+def status_frame(seqno):
+    """Return a status update as pushed by a protocol 3.3 device."""
+    cipher = pytuya.AESCipher(LOCAL_KEY.encode())
+    payload = _json({"devId": DEVICE_ID, "dps": {"1": bool(seqno % 2)}})
+    return _frame(
+        seqno, 0x08, pytuya.PROTOCOL_33_HEADER + cipher.encrypt(payload, False)
+    )
+
+
+def records(path):
+    """Return direction and data of all records in a capture file."""
+    return [(direction, data) for _, direction, data in pytuya.read_capture(path)]
+
+
+def test_capture_buffered_until_flushed(tmp_path):
+    """Test that records are only written to the file when flushed."""
+    path = tmp_path / "capture.bin"
+    capture = pytuya.TrafficCapture(path)
+    capture.write(pytuya.CAPTURE_CONNECT)
+    capture.write(pytuya.CAPTURE_OUT, b"request")
+    capture.write(pytuya.CAPTURE_IN, b"response")
+    assert records(path) == []
+
+    capture.flush(capture.take())
+    capture.write(pytuya.CAPTURE_DISCONNECT)
+    assert len(records(path)) == 3
+
+    capture.close(capture.take())
+    assert records(path) == [
+        (pytuya.CAPTURE_CONNECT, b""),
+        (pytuya.CAPTURE_OUT, b"request"),
+        (pytuya.CAPTURE_IN, b"response"),
+        (pytuya.CAPTURE_DISCONNECT, b""),
+    ]
+
+
+def test_replay_starts_over_after_disconnect():
+    """Test that a partial frame before a disconnect does not corrupt the next."""
+    partial = status_frame(1)[:30]
+
+    async def _test():
+        protocol = pytuya.TuyaProtocol(
+            DEVICE_ID,
+            LOCAL_KEY,
+            3.3,
+            asyncio.get_running_loop().create_future(),
+            pytuya.EmptyListener(),
+        )
+        replay = Replay(protocol)
+        for direction, data in [
+            (pytuya.CAPTURE_CONNECT, b""),
+            (pytuya.CAPTURE_IN, status_frame(1) + partial),
+            (pytuya.CAPTURE_DISCONNECT, b""),
+            (pytuya.CAPTURE_CONNECT, b""),
+            (pytuya.CAPTURE_IN, status_frame(2)),
+        ]:
+            replay.feed(direction, data)
+        return replay
+
+    replay = asyncio.run(_test())
+    assert replay.connections == 2
+    assert replay.frames == 2
+    assert replay.errors == []
+    assert replay.stats.decode_errors == 0
+
+
+def test_device_flushes_capture(tmp_path, monkeypatch):
+    """Test that a device writes captured traffic periodically and on stop."""
+    monkeypatch.setattr(common, "CAPTURE_FLUSH_INTERVAL", 0.01)
+    path = tmp_path / "capture.bin"
+
+    async def _test():
+        hass = mock_hass(asyncio.get_running_loop())
+        device = common.TuyaDevice(hass, device_config(DEVICE_ID))
+        await device.async_start_capture(path)
+        device._capture.write(pytuya.CAPTURE_IN, b"first")
+        await asyncio.sleep(0.5)
+        flushed = records(path)
+
+        device._capture.write(pytuya.CAPTURE_IN, b"second")
+        await device.async_stop_capture()
+        return flushed
+
+    assert asyncio.run(_test()) == [(pytuya.CAPTURE_IN, b"first")]
+    assert records(path) == [
+        (pytuya.CAPTURE_IN, b"first"),
+        (pytuya.CAPTURE_IN, b"second"),
+    ]
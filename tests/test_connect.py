@@ -0,0 +1,98 @@
+"""Tests for handling of connection failures in TuyaDevice."""
+import asyncio
+
+import pytest
+
+from custom_components.localtuya import pytuya
+from custom_components.localtuya.common import ConnectionAdmission, TuyaDevice
+from custom_components.localtuya.const import DATA_ADMISSION, DATA_STORE, DOMAIN
+
+from .common import device_config, mock_hass
+
+DEVICE_ID = "bf0123456789abcdefgh"
+FINGERPRINT = {"dev_type": "type_0d", "dps_to_request": ["1", "2"]}
+
+
+class FailingInterface:
+    """Connected interface failing to retrieve status."""
+
+    connect_latency = 0.01
+
+    def __init__(self, exc):
+        """Initialize a new FailingInterface."""
+        self.exc = exc
+
+    def add_dps_to_request(self, dp_indicies):
+        """Add datapoints to request."""
+
+    def restore_fingerprint(self, fingerprint):
+        """Restore device type."""
+
+    async def status(self):
+        """Fail to retrieve status."""
+        raise self.exc
+
+    def close(self):
+        """Close connection."""
+
+
+class ResettingInterface(FailingInterface):
+    """Connected interface reset by the device during the initial status."""
+
+    def __init__(self, listener):
+        """Initialize a new ResettingInterface."""
+        self.listener = listener
+
+    async def status(self):
+        """Lose the connection and return the cached status."""
+        self.listener.disconnected(ConnectionResetError())
+        return {"1": True}
+
+
+async def make_connection(monkeypatch, connect):
+    """Try to connect once and return fingerprint stored afterwards."""
+    hass = mock_hass(asyncio.get_running_loop())
+    hass.data[DOMAIN][DATA_ADMISSION] = ConnectionAdmission(hass, 1, 0)
+    store = hass.data[DOMAIN][DATA_STORE]
+    store.async_update_fingerprint(DEVICE_ID, FINGERPRINT)
+    monkeypatch.setattr(pytuya, "connect", connect)
+
+    device = TuyaDevice(hass, device_config(DEVICE_ID))
+    device.connect = lambda: None
+    await device._make_connection()
+    assert device.connect_failures == 1
+    return store.fingerprint(DEVICE_ID)
+
+
+@pytest.mark.parametrize(
+    "exc",
+    [ConnectionRefusedError(), OSError(113, "No route"), asyncio.TimeoutError()],
+)
+def test_fingerprint_kept_when_unreachable(monkeypatch, exc):
+    """Test that the fingerprint is kept when the device cannot be reached."""
+
+    async def _connect(*args, **kwargs):
+        raise exc
+
+    assert asyncio.run(make_connection(monkeypatch, _connect)) == FINGERPRINT
+
+
+@pytest.mark.parametrize(
+    "exc", [ValueError("Invalid JSON"), Exception("Failed to retrieve status")]
+)
+def test_fingerprint_cleared_after_connected(monkeypatch, exc):
+    """Test that the fingerprint is forgotten when talking to the device fails."""
+
+    async def _connect(*args, **kwargs):
+        return FailingInterface(exc)
+
+    assert asyncio.run(make_connection(monkeypatch, _connect)) is None
+
+
+def test_fingerprint_kept_when_reset_during_status(monkeypatch):
+    """Test that a reset during the initial status is an ordinary failure."""
+
+    async def _connect(host, device_id, local_key, version, listener, **kwargs):
+        return ResettingInterface(listener)
+
+    assert asyncio.run(make_connection(monkeypatch, _connect)) == FINGERPRINT
@@ -0,0 +1,68 @@
+"""Tests for detection of datapoints against simulated devices."""
+import asyncio
+
+import pytest
+
+from benchmarks.simulator import VirtualDevice
+from custom_components.localtuya import pytuya
+
+DEVICE_ID = "bf0123456789abcdefghij"
+LOCAL_KEY = b"0123456789abcdef"
+
+
+async def detect(dev_type, dps):
+    """Detect datapoints of a simulated device, return them and exchanges used."""
+    device = VirtualDevice(DEVICE_ID, LOCAL_KEY, dev_type=dev_type)
+    device.status = {str(dp): 0 for dp in dps}
+    await device.start()
+    interface = await pytuya.connect(
+        "127.0.0.1", DEVICE_ID, LOCAL_KEY.decode(), 3.3, port=device.port
+    )
+    try:
+        detected = await interface.detect_available_dps()
+        return sorted(int(dp) for dp in detected), interface.detect_exchanges
+    finally:
+        interface.close()
+        device.close()
+
+
+@pytest.mark.parametrize(
+    "dps",
+    [
+        {1, 2, 3, 101, 102},
+        {1, 20, 21, 22, 23, 24, 25, 26},
+        # Switch with child lock and power-on state
+        {1, 2, 3, 4, 7, 8, 9, 10, 14, 15},
+        # Plug with power metering
+        {1, 9, 17, 18, 19, 20, 21, 22, 23, 24, 25},
+        set(range(1, 26)),
+        # Sparse and gapped layouts
+        {1, 2, 3, 11, 12, 13, 14, 15, 16, 17, 18, 19},
+        {1, 24, 25, 26, 27, 28, 29, 30},
+        {1, 38},
+        {1, 30, 109},
+    ],
+)
+def test_detect_type_0d(dps):
+    """Test that datapoints in the common ranges are found in few exchanges."""
+    # The type_0a attempt plus four requests
+    assert asyncio.run(detect("type_0d", dps)) == (sorted(dps), 5)
+
+
+@pytest.mark.parametrize(
+    "dps,exchanges",
+    [
+        ({1, 2, 3, *range(101, 111)}, 6),
+        ({1, 101, 110, 118, 125}, 8),
+        ({1, 38, 40, 42, 44, 46, 48, 50, 52, 54, 56, 58}, 7),
+    ],
+)
+def test_detect_type_0d_expands(dps, exchanges):
+    """Test that datapoints past the common ranges are found next to others."""
+    assert asyncio.run(detect("type_0d", dps)) == (sorted(dps), exchanges)
+
+
+def test_detect_type_0a():
+    """Test that type_0a devices report all datapoints in one exchange."""
+    dps = {1, 2, 3, 40, 101, 150}
+    assert asyncio.run(detect("type_0a", dps)) == (sorted(dps), 1)
@@ -0,0 +1,55 @@
+"""Tests for handling of discovery broadcasts."""
+import logging
+
+import pytest
+
+from custom_components.localtuya.discovery import UDP_KEY, TuyaDiscovery
+from custom_components.localtuya.pytuya import AESCipher
+
+ADDR = ("192.168.1.10", 6667)
+BROADCAST = b'{"ip":"192.168.1.10","gwId":"bf0123456789abcdefgh","version":"3.3"}'
+
+
+def datagram(payload):
+    """Return a datagram with a payload framed like a broadcast."""
+    return b"\x00" * 20 + payload + b"\x00" * 8
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        b"",
+        b"not a broadcast",
+        b"\xff" * 33,
+        b"{truncated",
+        AESCipher(UDP_KEY).encrypt(b"\xff\xfe not json", False),
+        AESCipher(UDP_KEY).encrypt(b'["a list"]', False),
+    ],
+)
+def test_invalid_broadcast_ignored(caplog, payload):
+    """Test that invalid datagrams are dropped with a debug message."""
+    found = []
+    discovery = TuyaDiscovery(found.append)
+    with caplog.at_level(logging.DEBUG):
+        discovery.datagram_received(datagram(payload), ADDR)
+
+    assert found == []
+    assert discovery.devices == {}
+    (record,) = caplog.records
+    assert record.levelno == logging.DEBUG
+    assert record.exc_info is None
+
+
+@pytest.mark.parametrize(
+    "payload", [BROADCAST, AESCipher(UDP_KEY).encrypt(BROADCAST, False)]
+)
+def test_broadcast_found(payload):
+    """Test that plain and encrypted broadcasts are decoded."""
+    found = []
+    discovery = TuyaDiscovery(found.append)
+    discovery.datagram_received(datagram(payload), ADDR)
+    discovery.datagram_received(datagram(payload), ADDR)
+
+    assert [device["gwId"] for device in found] == ["bf0123456789abcdefgh"] * 2
+    assert list(discovery.devices) == ["192.168.1.10"]
+    assert discovery.cache_hits == 1
@@ -0,0 +1,166 @@
+"""Tests for parsing and dispatching of frames in MessageDispatcher."""
+import asyncio
+import struct
+
+import pytest
+
+from custom_components.localtuya import pytuya
+
+DEVICE_ID = "bf0123456789abcdefgh"
+
+RETCODE_OK = struct.pack(">I", 0)
+
+
+def frame(seqno, cmd=0x08, payload=b'{"dps":{"1":true}}'):
+    """Return a frame as sent by a device, including return code."""
+    return pytuya.pack_message(
+        pytuya.TuyaMessage(seqno, cmd, 0, RETCODE_OK + payload, 0)
+    )
+
+
+def make_dispatcher():
+    """Return a dispatcher and the list status updates are added to."""
+    received = []
+    return pytuya.MessageDispatcher(DEVICE_ID, received.append), received
+
+
+def test_frame_split_across_chunks():
+    """Test that a frame received in several chunks is parsed once complete."""
+    dispatcher, received = make_dispatcher()
+    data = frame(1)
+
+    for i in range(len(data) - 1):
+        dispatcher.add_data(data[i : i + 1])
+    assert received == []
+
+    dispatcher.add_data(data[-1:])
+    assert [(msg.seqno, msg.payload) for msg in received] == [
+        (1, b'{"dps":{"1":true}}')
+    ]
+    assert dispatcher.buffer == b""
+
+
+def test_several_frames_in_one_chunk():
+    """Test that all frames in a chunk are parsed, keeping a trailing partial one."""
+    dispatcher, received = make_dispatcher()
+    last = frame(4)
+
+    dispatcher.add_data(frame(1) + frame(2) + frame(3) + last[:10])
+    assert [msg.seqno for msg in received] == [1, 2, 3]
+
+    dispatcher.add_data(last[10:])
+    assert [msg.seqno for msg in received] == [1, 2, 3, 4]
+    assert dispatcher.stats.frames_in == 4
+
+
+def test_frame_without_retcode():
+    """Test that frames without return code are parsed."""
+    dispatcher, received = make_dispatcher()
+    payload = b"3.3" + 12 * b"\x00" + b"encrypted"
+
+    dispatcher.add_data(pytuya.pack_message(pytuya.TuyaMessage(1, 0x08, 0, payload, 0)))
+
+    assert [msg.payload for msg in received] == [payload]
+
+
+def test_bad_crc_is_dropped():
+    """Test that a frame with bad CRC is dropped and following frames parsed."""
+    dispatcher, received = make_dispatcher()
+    corrupt = bytearray(frame(1))
+    corrupt[-12] ^= 0xFF  # Last payload byte
+
+    dispatcher.add_data(bytes(corrupt) + frame(2))
+
+    assert [msg.seqno for msg in received] == [2]
+    assert dispatcher.stats.decode_errors == 1
+
+
+def test_bad_prefix_is_skipped():
+    """Test that data before a frame prefix is skipped."""
+    dispatcher, received = make_dispatcher()
+
+    dispatcher.add_data(b"garbage" + frame(1) + b"\x00\x00\x55" + frame(2))
+
+    assert [msg.seqno for msg in received] == [1, 2]
+    assert dispatcher.stats.decode_errors == 2
+
+
+def test_partial_prefix_is_kept():
+    """Test that a prefix split across chunks is found after skipping garbage."""
+    dispatcher, received = make_dispatcher()
+    data = frame(1)
+
+    dispatcher.add_data(b"garbage after a corrupt frame" + data[:2])
+    dispatcher.add_data(data[2:])
+
+    assert [msg.seqno for msg in received] == [1]
+
+
+def test_responses_matched_by_seqno():
+    """Test that concurrent requests get the response with their seqno."""
+
+    async def _test():
+        dispatcher, received = make_dispatcher()
+        first = asyncio.ensure_future(dispatcher.wait_for(1, 0x07))
+        second = asyncio.ensure_future(dispatcher.wait_for(2, 0x0A))
+        await asyncio.sleep(0)
+
+        dispatcher.add_data(frame(2, 0x0A, b"second") + frame(1, 0x07, b"first"))
+        responses = await asyncio.gather(first, second)
+        return responses, received, dispatcher.listeners
+
+    (first, second), received, listeners = asyncio.run(_test())
+    assert (first.seqno, first.payload) == (1, b"first")
+    assert (second.seqno, second.payload) == (2, b"second")
+    assert received == []
+    assert listeners == {}
+
+
+def test_timeout_only_affects_expired_request():
+    """Test that requests time out on their own deadline."""
+
+    async def _test():
+        dispatcher, _ = make_dispatcher()
+        short = asyncio.ensure_future(dispatcher.wait_for(1, 0x0A, timeout=0.01))
+        other = asyncio.ensure_future(dispatcher.wait_for(2, 0x0A, timeout=5))
+        with pytest.raises(asyncio.TimeoutError):
+            await short
+        assert list(dispatcher.listeners) == [2]
+
+        # A late response for the expired request must not be taken by another
+        dispatcher.add_data(frame(1, 0x0A) + frame(2, 0x0A, b"other"))
+        return (await other).payload, dispatcher.listeners
+
+    assert asyncio.run(_test()) == (b"other", {})
+
+
+def test_heartbeat_with_seqno_zero():
+    """Test that a heartbeat response without seqno resolves a heartbeat request."""
+
+    async def _test():
+        dispatcher, _ = make_dispatcher()
+        status = asyncio.ensure_future(dispatcher.wait_for(0, 0x0A))
+        heartbeat = asyncio.ensure_future(dispatcher.wait_for(5, 0x09))
+        await asyncio.sleep(0)
+
+        dispatcher.add_data(frame(0, 0x09, b""))
+        response = await heartbeat
+        return response.cmd, status.done(), list(dispatcher.listeners)
+
+    assert asyncio.run(_test()) == (0x09, False, [0])
+
+
+def test_duplicate_seqno_rejected():
+    """Test that only one request can wait for a seqno."""
+
+    async def _test():
+        dispatcher, _ = make_dispatcher()
+        waiting = asyncio.ensure_future(dispatcher.wait_for(1, 0x0A))
+        await asyncio.sleep(0)
+        with pytest.raises(Exception, match="listener exists"):
+            await dispatcher.wait_for(1, 0x0A)
+
+        dispatcher.abort()
+        return await waiting
+
+    assert asyncio.run(_test()) is None
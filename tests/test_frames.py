@@ -0,0 +1,117 @@
+"""Tests pinning the frames sent for every command on the wire.
+
+Expected frames were produced by the implementation before commands were
+compiled into templates, with the same time and sequence number.
+"""
+import asyncio
+import time
+
+import pytest
+
+from custom_components.localtuya import pytuya
+from custom_components.localtuya.pytuya import HEARTBEAT, SET, STATUS
+
+DEVICE_ID = "bf0123456789abcdefgh"
+LOCAL_KEY = "0123456789abcdef"
+TIMESTAMP = 1605000000.5
+SEQNO = 7
+SET_DPS = {"1": True, "2": 50, "4": "manual"}
+
+FRAMES = {
+    (3.1, "type_0a", STATUS): (
+        "000055aa000000070000000a000000467b2267774964223a2262663031323334"
+        "35363738396162636465666768222c226465764964223a226266303132333435"
+        "363738396162636465666768227dee5938b60000aa55"
+    ),
+    (3.1, "type_0a", SET): (
+        "000055aa0000000700000007000000c7332e3162393465613662613534366665"
+        "6236617a34596b5834436b50395742366668302b4c7265462f576d777035394c"
+        "6d636d477a414869664a336b5450647136706d337456474d5a582f5858434e46"
+        "6839363456453173474e696e3256626a706164634b4144787461367468756c33"
+        "4e3655636131646973507362527934672f513137356c4a66764d6d596a373259"
+        "724876704235576e57516857796e336e554438687637624f6c30535661705353"
+        "473931712f61432b774c364b73553dbdb277eb0000aa55"
+    ),
+    (3.1, "type_0a", HEARTBEAT): (
+        "000055aa00000007000000090000000a7b7d271d11360000aa55"
+    ),
+    (3.1, "type_0d", STATUS): (
+        "000055aa000000070000000d000000797b226465764964223a22626630313233"
+        "3435363738396162636465666768222c22756964223a22626630313233343536"
+        "3738396162636465666768222c2274223a2231363035303030303030222c2264"
+        "7073223a7b2231223a6e756c6c2c2232223a6e756c6c2c2234223a6e756c6c7d"
+        "7d4a118af80000aa55"
+    ),
+    (3.1, "type_0d", SET): (
+        "000055aa0000000700000007000000c7332e3162393465613662613534366665"
+        "6236617a34596b5834436b50395742366668302b4c7265462f576d777035394c"
+        "6d636d477a414869664a336b5450647136706d337456474d5a582f5858434e46"
+        "6839363456453173474e696e3256626a706164634b4144787461367468756c33"
+        "4e3655636131646973507362527934672f513137356c4a66764d6d596a373259"
+        "724876704235576e57516857796e336e554438687637624f6c30535661705353"
+        "473931712f61432b774c364b73553dbdb277eb0000aa55"
+    ),
+    (3.1, "type_0d", HEARTBEAT): (
+        "000055aa00000007000000090000000a7b7d271d11360000aa55"
+    ),
+    (3.3, "type_0a", STATUS): (
+        "000055aa000000070000000a00000048a582c52e5a14f42dc57e6b4371d0f789"
+        "8f84c1b859b79478a8eff0e87abb16691d6e826df5b2d248589c9b1fe24d857c"
+        "0b7df1acbb51e93d02a76bac8d5ef6e55977cc5c0000aa55"
+    ),
+    (3.3, "type_0a", SET): (
+        "000055aa000000070000000700000097332e33000000000000000000000000cf"
+        "86245f80a43fd581e9f874f8bade17f5a6c29e7d2e67261b300789f2779133dd"
+        "abaa66ded5463195ff5d708d161f7ae15135b063629f655b8e969d70a003c6d6"
+        "bab61ba5dcde9471ad5d8ac3ec6d1cb883f435ef99497ef326623ef662b1efa4"
+        "1e569d64215b29f79d40fc86fedb3a5d1255aa52486f75abf682fb02fa2ac504"
+        "0f564e0000aa55"
+    ),
+    (3.3, "type_0a", HEARTBEAT): (
+        "000055aa000000070000000900000027332e33000000000000000000000000cb"
+        "70ddc25a2a2045b4c13084418a9abba56098200000aa55"
+    ),
+    (3.3, "type_0d", STATUS): (
+        "000055aa000000070000000d00000097332e33000000000000000000000000cf"
+        "86245f80a43fd581e9f874f8bade17f5a6c29e7d2e67261b300789f2779133dd"
+        "abaa66ded5463195ff5d708d161f7ae15135b063629f655b8e969d70a003c6d6"
+        "bab61ba5dcde9471ad5d8ac3ec6d1c551c445034f0b6db2c58af6dae53d36574"
+        "d975295f2af44ebe3664899904b71903000aeb4ff51d29188f82e4a162a1f643"
+        "7d0f690000aa55"
+    ),
+    (3.3, "type_0d", SET): (
+        "000055aa000000070000000700000097332e33000000000000000000000000cf"
+        "86245f80a43fd581e9f874f8bade17f5a6c29e7d2e67261b300789f2779133dd"
+        "abaa66ded5463195ff5d708d161f7ae15135b063629f655b8e969d70a003c6d6"
+        "bab61ba5dcde9471ad5d8ac3ec6d1cb883f435ef99497ef326623ef662b1efa4"
+        "1e569d64215b29f79d40fc86fedb3a5d1255aa52486f75abf682fb02fa2ac504"
+        "0f564e0000aa55"
+    ),
+    (3.3, "type_0d", HEARTBEAT): (
+        "000055aa000000070000000900000027332e33000000000000000000000000cb"
+        "70ddc25a2a2045b4c13084418a9abba56098200000aa55"
+    ),
+}
+
+
+@pytest.mark.parametrize("codec", sorted(pytuya.JSON_CODECS))
+@pytest.mark.parametrize("version,dev_type,command", sorted(FRAMES))
+def test_frame(monkeypatch, codec, version, dev_type, command):
+    """Test that commands are encoded exactly as before."""
+    monkeypatch.setattr(pytuya, "JSON_CODEC", pytuya.JSON_CODECS[codec])
+    monkeypatch.setattr(time, "time", lambda: TIMESTAMP)
+
+    async def _test():
+        protocol = pytuya.TuyaProtocol(
+            DEVICE_ID,
+            LOCAL_KEY,
+            version,
+            asyncio.get_running_loop().create_future(),
+            pytuya.EmptyListener(),
+        )
+        protocol.dev_type = dev_type
+        protocol.add_dps_to_request(["1", "2", "4"])
+        protocol.seqno = SEQNO
+        return protocol._generate_payload(command, SET_DPS if command == SET else None)
+
+    assert asyncio.run(_test()).hex() == FRAMES[version, dev_type, command]
@@ -0,0 +1,102 @@
+"""Tests for parity of the JSON codecs with the standard library."""
+import asyncio
+import json
+
+import pytest
+
+from custom_components.localtuya import pytuya
+from custom_components.localtuya.pytuya import HEARTBEAT, SET, STATUS
+
+from .test_frames import DEVICE_ID, FRAMES, LOCAL_KEY, SET_DPS
+
+CODECS = sorted(pytuya.JSON_CODECS)
+
+# Payloads as received from devices
+PAYLOADS = [
+    b'{"devId":"bf0123456789abcdefgh","dps":{"1":true,"2":50,"4":"manual"}}',
+    b'{"dps":{"1":false,"101":-12,"102":1.5,"103":null},"t":1605000000}',
+    '{"dps":{"1":"Kök \\"lampa\\"","2":"\\u00e9t\\u00e9","3":"a b"}}'.encode(),
+    b'{"dps":{"1":{"on":[1,2,3]},"2":9007199254740993,"3":1e-7}}',
+]
+
+# Commands sent in FRAMES as decoded by the device
+COMMANDS = {
+    ("type_0a", STATUS): {"gwId": DEVICE_ID, "devId": DEVICE_ID},
+    ("type_0d", STATUS): {
+        "devId": DEVICE_ID,
+        "uid": DEVICE_ID,
+        "t": "1605000000",
+        "dps": {"1": None, "2": None, "4": None},
+    },
+    ("type_0a", SET): {
+        "devId": DEVICE_ID,
+        "uid": DEVICE_ID,
+        "t": "1605000000",
+        "dps": SET_DPS,
+    },
+    ("type_0a", HEARTBEAT): {},
+}
+COMMANDS["type_0d", SET] = COMMANDS["type_0a", SET]
+COMMANDS["type_0d", HEARTBEAT] = COMMANDS["type_0a", HEARTBEAT]
+
+
+def encrypt(version, raw):
+    """Return payload of a frame sent by a device."""
+    cipher = pytuya.AESCipher(LOCAL_KEY.encode())
+    if version == 3.3:
+        return pytuya.PROTOCOL_33_HEADER + cipher.encrypt(raw, False)
+    # The MD5 digest is not checked when receiving
+    return pytuya.PROTOCOL_VERSION_BYTES_31 + b"0" * 16 + cipher.encrypt(raw)
+
+
+def decode(codec, version, dev_type, payload):
+    """Decode payload with a codec as TuyaProtocol does."""
+
+    async def _decode():
+        protocol = pytuya.TuyaProtocol(
+            DEVICE_ID,
+            LOCAL_KEY,
+            version,
+            asyncio.get_running_loop().create_future(),
+            pytuya.EmptyListener(),
+        )
+        protocol.dev_type = dev_type
+        protocol.debug = lambda *_: None
+        return protocol._decode_payload(payload)
+
+    original = pytuya.JSON_CODEC
+    pytuya.JSON_CODEC = pytuya.JSON_CODECS[codec]
+    try:
+        return asyncio.run(_decode())
+    finally:
+        pytuya.JSON_CODEC = original
+
+
+@pytest.mark.parametrize("codec", CODECS)
+@pytest.mark.parametrize("version", [3.1, 3.3])
+@pytest.mark.parametrize("raw", PAYLOADS)
+def test_decode_received(codec, version, raw):
+    """Test that received payloads decode as with json.loads."""
+    expected = json.loads(raw.decode())
+    assert decode(codec, version, "type_0d", encrypt(version, raw)) == expected
+    assert decode(codec, version, "type_0a", raw) == expected
+
+
+@pytest.mark.parametrize("codec", CODECS)
+@pytest.mark.parametrize("version,dev_type,command", sorted(FRAMES))
+def test_decode_sent(codec, version, dev_type, command):
+    """Test that frames encoded by the previous implementation decode the same."""
+    frame = bytes.fromhex(FRAMES[version, dev_type, command])
+    payload = frame[pytuya.MESSAGE_HEADER.size : -pytuya.MESSAGE_END.size]
+    assert decode(codec, version, dev_type, payload) == COMMANDS[dev_type, command]
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_encode(codec):
+    """Test that codecs encode ASCII data like json.dumps without whitespace."""
+    for raw in PAYLOADS[:2]:
+        obj = json.loads(raw)
+        assert (
+            pytuya.JSON_CODECS[codec].dumps(obj)
+            == json.dumps(obj, separators=(",", ":")).encode()
+        )
@@ -0,0 +1,58 @@
+"""Tests for connection handling in TuyaProtocol."""
+import asyncio
+import logging
+
+from custom_components.localtuya import pytuya
+
+DEVICE_ID = "bf0123456789abcdefgh"
+LOCAL_KEY = "0123456789abcdef"
+
+
+def make_protocol(heartbeat):
+    """Return a protocol sending heartbeats with a coroutine function."""
+    loop = asyncio.get_running_loop()
+    protocol = pytuya.TuyaProtocol(
+        DEVICE_ID, LOCAL_KEY, 3.3, loop.create_future(), pytuya.EmptyListener()
+    )
+    protocol.transport = object()
+    protocol.heartbeat = heartbeat
+    protocol.closed = 0
+
+    def _close():
+        protocol.closed += 1
+
+    protocol.close = _close
+    return protocol
+
+
+def test_heartbeat_timeout_disconnects(caplog):
+    """Test that a heartbeat timeout closes the connection with a warning."""
+
+    async def _heartbeat():
+        raise asyncio.TimeoutError()
+
+    async def _test():
+        protocol = make_protocol(_heartbeat)
+        await protocol._send_heartbeat()
+        return protocol.closed, protocol.heartbeats_sent
+
+    with caplog.at_level(logging.WARNING):
+        assert asyncio.run(_test()) == (1, 0)
+    (record,) = caplog.records
+    assert record.levelno == logging.WARNING
+    assert record.exc_info is None
+    assert "Heartbeat timed out" in record.getMessage()
+
+
+def test_heartbeat_cancelled_on_close():
+    """Test that cancelling a heartbeat does not close the connection again."""
+
+    async def _test():
+        protocol = make_protocol(asyncio.Event().wait)
+        task = asyncio.ensure_future(protocol._send_heartbeat())
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.wait([task])
+        return task.cancelled(), protocol.closed
+
+    assert asyncio.run(_test()) == (True, 0)
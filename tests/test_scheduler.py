@@ -0,0 +1,137 @@
+"""Tests for ordering of exchanges by CommandScheduler."""
+import asyncio
+
+import pytest
+
+from custom_components.localtuya import pytuya
+
+INTERACTIVE = pytuya.PRIORITY_INTERACTIVE
+BACKGROUND = pytuya.PRIORITY_BACKGROUND
+
+
+async def exchange(scheduler, name, admitted, release):
+    """Hold a slot until release is set, recording when admitted."""
+    async with scheduler.slot(
+        BACKGROUND if name.startswith("background") else INTERACTIVE
+    ):
+        admitted.append(name)
+        await release.wait()
+
+
+async def settle():
+    """Let all ready tasks run."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_interactive_admitted_before_background():
+    """Test that waiting exchanges are admitted by priority, then in order."""
+
+    async def _test():
+        scheduler = pytuya.CommandScheduler(max_inflight=1)
+        admitted = []
+        releases = {}
+        for name in ["first", "background1", "interactive1", "interactive2"]:
+            releases[name] = asyncio.Event()
+            asyncio.ensure_future(exchange(scheduler, name, admitted, releases[name]))
+            await settle()
+
+        for name in ["first", "interactive1", "interactive2", "background1"]:
+            assert admitted[-1] == name
+            releases[name].set()
+            await settle()
+        return admitted, scheduler.inflight
+
+    admitted, inflight = asyncio.run(_test())
+    assert admitted == ["first", "interactive1", "interactive2", "background1"]
+    assert inflight == 0
+
+
+def test_background_waits_for_idle_device():
+    """Test that background exchanges only run when nothing else is in flight."""
+
+    async def _test():
+        scheduler = pytuya.CommandScheduler(max_inflight=2)
+        admitted = []
+        release = asyncio.Event()
+        asyncio.ensure_future(exchange(scheduler, "interactive", admitted, release))
+        await settle()
+        asyncio.ensure_future(exchange(scheduler, "background", admitted, release))
+        await settle()
+        before = list(admitted)
+
+        release.set()
+        await settle()
+        return before, admitted
+
+    assert asyncio.run(_test()) == (["interactive"], ["interactive", "background"])
+
+
+def test_cancelled_while_waiting():
+    """Test that a cancelled exchange leaves the queue without taking a slot."""
+
+    async def _test():
+        scheduler = pytuya.CommandScheduler(max_inflight=1)
+        admitted = []
+        release = asyncio.Event()
+        asyncio.ensure_future(exchange(scheduler, "first", admitted, release))
+        await settle()
+        cancelled = asyncio.ensure_future(
+            exchange(scheduler, "cancelled", admitted, release)
+        )
+        asyncio.ensure_future(exchange(scheduler, "last", admitted, release))
+        await settle()
+
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        release.set()
+        await settle()
+        return admitted, scheduler.inflight
+
+    assert asyncio.run(_test()) == (["first", "last"], 0)
+
+
+def test_cancelled_right_after_admitted():
+    """Test that the slot is handed on when cancelled before running."""
+
+    async def _test():
+        scheduler = pytuya.CommandScheduler(max_inflight=1)
+        admitted = []
+        release = asyncio.Event()
+        first_release = asyncio.Event()
+        asyncio.ensure_future(exchange(scheduler, "first", admitted, first_release))
+        await settle()
+        cancelled = asyncio.ensure_future(
+            exchange(scheduler, "cancelled", admitted, release)
+        )
+        asyncio.ensure_future(exchange(scheduler, "last", admitted, release))
+        await settle()
+
+        # Admitted when the first exchange ends, cancelled before it resumes
+        first_release.set()
+        await asyncio.sleep(0)
+        assert scheduler.inflight == 1
+        cancelled.cancel()
+        await settle()
+        release.set()
+        await settle()
+        return admitted, scheduler.inflight, cancelled.cancelled()
+
+    assert asyncio.run(_test()) == (["first", "last"], 0, True)
+
+
+def test_wait_stats():
+    """Test that time waiting for a slot is recorded per priority."""
+
+    async def _test():
+        scheduler = pytuya.CommandScheduler()
+        async with scheduler.slot(INTERACTIVE):
+            pass
+        async with scheduler.slot(BACKGROUND):
+            pass
+        return scheduler.wait_stats()
+
+    stats = asyncio.run(_test())
+    assert stats["interactive"]["count"] == 1
+    assert stats["background"]["count"] == 1
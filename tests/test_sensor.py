@@ -0,0 +1,298 @@
+"""Tests for filtering of sensor updates and power metering of switches."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from custom_components.localtuya.common import TuyaDevice, get_dps_for_platform
+from custom_components.localtuya.const import (
+    CONF_AVERAGE_WINDOW,
+    CONF_CURRENT_CONSUMPTION,
+    CONF_DEADBAND,
+    CONF_DEADBAND_PERCENT,
+    CONF_MAX_INTERVAL,
+    CONF_MIN_INTERVAL,
+)
+from custom_components.localtuya.sensor import (
+    LocaltuyaPowerSensor,
+    LocaltuyaSensor,
+    WindowedStats,
+)
+from custom_components.localtuya.switch import LocaltuyaSwitch, flow_schema
+
+from .common import device_config, mock_hass
+
+POWER_DP = "19"
+
+
+def test_steady_value_fills_window():
+    """Test that a value reported once keeps being the mean."""
+    stats = WindowedStats(60)
+    stats.add(0, 1500)
+
+    assert stats.mean(30) == 1500
+    assert stats.mean(600) == 1500
+    assert (stats.min, stats.max) == (1500, 1500)
+
+
+def test_drop_to_zero_expires_old_value():
+    """Test that the mean follows a drop to zero as time passes."""
+    stats = WindowedStats(60)
+    stats.add(0, 1500)
+    stats.add(100, 0)
+
+    assert stats.mean(100) == 1500
+    assert stats.mean(130) == 750
+    assert stats.mean(160) == 0
+    assert (stats.min, stats.max) == (0, 0)
+    assert len(stats) == 1
+
+
+def test_mean_weighted_by_time():
+    """Test that each value counts by how long it held, not how often it was seen."""
+    stats = WindowedStats(60)
+    stats.add(0, 100)
+    for time in range(50, 60):
+        stats.add(time, 200)
+
+    assert stats.mean(60) == pytest.approx((100 * 50 + 200 * 10) / 60)
+    assert (stats.min, stats.max) == (100, 200)
+
+
+class FakeTimer:
+    """Timer scheduled on a FakeLoop."""
+
+    def __init__(self, deadline, callback):
+        """Initialize a new FakeTimer."""
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+
+    def when(self):
+        """Return when the timer fires."""
+        return self.deadline
+
+    def cancel(self):
+        """Cancel the timer."""
+        self.cancelled = True
+
+
+class FakeLoop:
+    """Loop time and timers controlled by the test."""
+
+    create_task = None
+    run_in_executor = None
+
+    def __init__(self):
+        """Initialize a new FakeLoop."""
+        self.now = 0.0
+        self.timers = []
+
+    def time(self):
+        """Return current time."""
+        return self.now
+
+    def call_later(self, delay, callback):
+        """Schedule a callback."""
+        timer = FakeTimer(self.now + delay, callback)
+        self.timers.append(timer)
+        return timer
+
+    def run_until(self, now):
+        """Advance time to now and run timers due until then."""
+        while True:
+            due = [
+                timer
+                for timer in self.timers
+                if not timer.cancelled and timer.deadline <= now
+            ]
+            if not due:
+                break
+            timer = min(due, key=FakeTimer.when)
+            self.timers.remove(timer)
+            self.now = timer.deadline
+            timer.callback()
+        self.now = now
+
+
+def sensor_entity(sensor, loop):
+    """Make a sensor record the states it writes."""
+    sensor.hass = mock_hass(loop)
+    sensor.written = []
+    sensor.async_write_ha_state = lambda: sensor.written.append(sensor.state)
+    return sensor
+
+
+def filtered_sensor(**options):
+    """Return a sensor with filtering options and the loop it uses."""
+    loop = FakeLoop()
+    entities = [{"id": 2, "platform": "sensor", "friendly_name": "Power", **options}]
+    config_entry = SimpleNamespace(data=device_config(entities=entities))
+    device = TuyaDevice(mock_hass(loop), config_entry.data)
+    return sensor_entity(LocaltuyaSensor(device, config_entry, 2), loop), loop
+
+
+def metering_switch(window=0):
+    """Return config entry of a switch with power metering."""
+    switch = {
+        "id": 1,
+        "platform": "switch",
+        "friendly_name": "Plug",
+        CONF_CURRENT_CONSUMPTION: int(POWER_DP),
+        CONF_AVERAGE_WINDOW: window,
+    }
+    return SimpleNamespace(data=device_config(entities=[switch]))
+
+
+def power_sensor(window):
+    """Return a power sensor of a switch and the loop it uses."""
+    loop = FakeLoop()
+    config_entry = metering_switch(window)
+    sensor = LocaltuyaPowerSensor(
+        TuyaDevice(mock_hass(loop), config_entry.data),
+        config_entry,
+        1,
+        CONF_CURRENT_CONSUMPTION,
+    )
+    return sensor_entity(sensor, loop), loop
+
+
+def report(sensor, value):
+    """Report a new value from the device."""
+    sensor._status = {str(sensor._dp_id): value}
+    if sensor.status_updated():
+        sensor.written.append(sensor.state)
+
+
+def test_power_sensor_follows_drop_to_zero():
+    """Test that re-sampling updates the mean without reports from the device."""
+
+    async def _test():
+        sensor, clock = power_sensor(60)
+        report(sensor, 15000)
+        for clock.now in range(6, 100, 6):
+            sensor._async_resample(None)
+        assert sensor.written == [1500.0]
+
+        clock.now = 100
+        report(sensor, 0)
+        for clock.now in range(106, 200, 6):
+            sensor._async_resample(None)
+        return sensor
+
+    sensor = asyncio.run(_test())
+    assert sensor.written[1] == 1350.0
+    assert sensor.written[-1] == 0.0
+    assert sensor.written == sorted(sensor.written, reverse=True)
+    assert sensor.device_state_attributes == {"min": 0.0, "max": 0.0}
+
+
+def test_power_sensor_unavailable_not_resampled():
+    """Test that nothing is written while the device is disconnected."""
+
+    async def _test():
+        sensor, clock = power_sensor(60)
+        report(sensor, 15000)
+        sensor._status = {}
+        clock.now = 10
+        sensor._async_resample(None)
+        return sensor.written
+
+    assert asyncio.run(_test()) == [1500.0]
+
+
+def test_switch_not_updated_by_power_metering():
+    """Test that a switch only subscribes to its relay."""
+
+    async def _test():
+        config_entry = metering_switch()
+        switch = LocaltuyaSwitch(
+            TuyaDevice(mock_hass(asyncio.get_running_loop()), config_entry.data),
+            config_entry,
+            1,
+            dps_config_fields=list(get_dps_for_platform(flow_schema)),
+        )
+        return switch._dps
+
+    assert asyncio.run(_test()) == {"1"}
+
+
+def test_deadband_absolute():
+    """Test that changes within an absolute deadband are not written."""
+
+    async def _test():
+        sensor, _ = filtered_sensor(**{CONF_DEADBAND: 5})
+        for value in (100, 104, 96, 105.5, 101):
+            report(sensor, value)
+        return sensor.written, sensor.state, sensor._device.suppressed_updates
+
+    assert asyncio.run(_test()) == ([100, 105.5], 105.5, 3)
+
+
+def test_deadband_percent():
+    """Test that changes within a relative deadband are not written."""
+
+    async def _test():
+        sensor, _ = filtered_sensor(**{CONF_DEADBAND_PERCENT: 10})
+        for value in (100, 109, 91, 111, 0, 0.5, 0.5):
+            report(sensor, value)
+        return sensor.written, sensor._device.suppressed_updates
+
+    # Any change from 0 is significant, the same value never is
+    assert asyncio.run(_test()) == ([100, 111, 0, 0.5], 3)
+
+
+def test_min_interval():
+    """Test that states are written at most once per min_interval."""
+
+    async def _test():
+        sensor, loop = filtered_sensor(**{CONF_MIN_INTERVAL: 10})
+        report(sensor, 1)
+        for loop.now, value in ((2, 2), (5, 3)):
+            report(sensor, value)
+        written = list(sensor.written)
+        loop.run_until(10)
+        loop.now = 15
+        report(sensor, 4)
+        loop.run_until(30)
+        return written, sensor.written, sensor._device.suppressed_updates
+
+    written, delayed, suppressed = asyncio.run(_test())
+    assert written == [1]
+    # The latest state is written once the interval has passed
+    assert delayed == [1, 3, 4]
+    assert suppressed == 3
+
+
+def test_max_interval():
+    """Test that a change within the deadband is written after max_interval."""
+
+    async def _test():
+        sensor, loop = filtered_sensor(**{CONF_DEADBAND: 5, CONF_MAX_INTERVAL: 30})
+        report(sensor, 100)
+        loop.now = 1
+        report(sensor, 103)
+        loop.run_until(29)
+        written = list(sensor.written)
+        loop.run_until(31)
+        loop.now = 100
+        report(sensor, 104)
+        return written, sensor.written, sensor._device.suppressed_updates
+
+    written, forced, suppressed = asyncio.run(_test())
+    assert written == [100]
+    assert forced == [100, 103, 104]
+    assert suppressed == 1
+
+
+def test_unchanged_state_not_rescheduled():
+    """Test that repeated values are counted but never written."""
+
+    async def _test():
+        sensor, loop = filtered_sensor(**{CONF_MAX_INTERVAL: 30})
+        for loop.now in range(0, 100, 10):
+            report(sensor, 7)
+        loop.run_until(200)
+        return sensor.written, sensor._device.suppressed_updates, loop.timers
+
+    assert asyncio.run(_test()) == ([7], 9, [])
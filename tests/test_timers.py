@@ -0,0 +1,80 @@
+"""Tests for the shared TimerScheduler."""
+import asyncio
+import time
+
+from custom_components.localtuya import pytuya
+
+
+def test_timers_fire_in_deadline_order():
+    """Test that timers fire by deadline, then in the order they were added."""
+
+    async def _test():
+        timers = pytuya.TimerScheduler(resolution=0.01)
+        fired = []
+        timers.call_later(0.05, fired.append, "late")
+        timers.call_later(0.02, fired.append, "first")
+        timers.call_later(0.02, fired.append, "second")
+        # Due before the timer the task is already waiting for
+        timers.call_later(0.001, fired.append, "early")
+        await asyncio.sleep(0.1)
+        return fired, timers.lag_stats()
+
+    fired, stats = asyncio.run(_test())
+    assert fired == ["early", "first", "second", "late"]
+    assert stats["fired"] == 4
+    assert stats["wakeups"] <= 3
+    assert stats["pending"] == 0
+
+
+def test_cancelled_timer_not_fired():
+    """Test that cancelled timers are skipped and not counted."""
+
+    async def _test():
+        timers = pytuya.TimerScheduler(resolution=0.01)
+        fired = []
+        timers.call_later(0.02, fired.append, "cancelled").cancel()
+        timers.call_later(0.02, fired.append, "kept")
+        await asyncio.sleep(0.05)
+        return fired, timers.lag_stats()["fired"]
+
+    assert asyncio.run(_test()) == (["kept"], 1)
+
+
+def test_failing_callback_does_not_stop_timers():
+    """Test that an exception in one callback does not affect other timers."""
+
+    def _fail():
+        raise ValueError()
+
+    async def _test():
+        timers = pytuya.TimerScheduler(resolution=0.01)
+        fired = []
+        timers.call_later(0.01, _fail)
+        timers.call_later(0.01, fired.append, "after")
+        await asyncio.sleep(0.05)
+        return fired
+
+    assert asyncio.run(_test()) == ["after"]
+
+
+def test_lag_accounting():
+    """Test that lag of timers held up by a blocked loop is recorded."""
+
+    async def _test():
+        timers = pytuya.TimerScheduler(resolution=0.01)
+        timers.call_later(0.01, lambda: None)
+        await asyncio.sleep(0.05)
+        on_time = timers.lag_stats()
+
+        timers.call_later(0.01, lambda: None)
+        time.sleep(0.1)
+        await asyncio.sleep(0.01)
+        return on_time, timers.lag_stats()
+
+    on_time, late = asyncio.run(_test())
+    assert on_time["fired"] == 1
+    assert on_time["max_lag"] < 0.05
+    assert late["fired"] == 2
+    assert late["last_lag"] >= 0.08
+    assert late["max_lag"] == late["last_lag"]
+    assert late["average_lag"] == (on_time["last_lag"] + late["last_lag"]) / 2
@@ -0,0 +1,84 @@
+"""Tests for merging of writes in TuyaDevice.set_dps."""
+import asyncio
+
+from custom_components.localtuya.const import CONF_WRITE_WINDOW
+
+from .common import connected_device, mock_hass
+
+
+def test_write_sent_right_away_when_idle():
+    """Test that sequential writes do not wait for the write window."""
+
+    async def _test():
+        device = connected_device(
+            mock_hass(asyncio.get_running_loop()), **{CONF_WRITE_WINDOW: 60}
+        )
+        await asyncio.wait_for(device.set_dp(True, 1), 1)
+        await asyncio.wait_for(device.set_dp(False, 1), 1)
+        return device._interface.commands
+
+    assert asyncio.run(_test()) == [{"1": True}, {"1": False}]
+
+
+def test_writes_in_same_iteration_merged():
+    """Test that concurrent writes to an idle device are sent as one command."""
+
+    async def _test():
+        device = connected_device(mock_hass(asyncio.get_running_loop()))
+        results = await asyncio.gather(
+            device.set_dp(True, 1), device.set_dps({2: 50, 3: "white"})
+        )
+        return device._interface.commands, results
+
+    commands, results = asyncio.run(_test())
+    assert commands == [{"1": True, "2": 50, "3": "white"}]
+    assert results == [{"dps": commands[0]}] * 2
+
+
+def test_writes_merged_while_in_flight():
+    """Test that writes made while a command is in flight are merged."""
+
+    async def _test():
+        device = connected_device(
+            mock_hass(asyncio.get_running_loop()), **{CONF_WRITE_WINDOW: 0.01}
+        )
+        interface = device._interface
+        interface.busy = asyncio.Event()
+
+        first = asyncio.ensure_future(device.set_dp(10, 2))
+        await asyncio.sleep(0.001)
+        assert interface.commands == [{"2": 10}]
+
+        later = [asyncio.ensure_future(device.set_dp(value, 2)) for value in (20, 30)]
+        later.append(asyncio.ensure_future(device.set_dp(True, 1)))
+        await asyncio.sleep(0.05)
+        assert len(interface.commands) == 1
+
+        interface.busy.set()
+        await asyncio.gather(first, *later)
+        return interface.commands, [task.result() for task in later]
+
+    commands, results = asyncio.run(_test())
+    assert commands == [{"2": 10}, {"2": 30, "1": True}]
+    assert results == [{"dps": {"2": 30, "1": True}}] * 3
+
+
+def test_pending_writes_resolved_on_close():
+    """Test that callers waiting for a merged write are released on close."""
+
+    async def _test():
+        device = connected_device(
+            mock_hass(asyncio.get_running_loop()), **{CONF_WRITE_WINDOW: 60}
+        )
+        device._interface.busy = asyncio.Event()
+        first = asyncio.ensure_future(device.set_dp(True, 1))
+        await asyncio.sleep(0.001)
+        pending = asyncio.ensure_future(device.set_dp(False, 1))
+        await asyncio.sleep(0)
+
+        device.close()
+        result = await asyncio.wait_for(pending, 1)
+        first.cancel()
+        return result
+
+    assert asyncio.run(_test()) is None